@@ -15,10 +15,3055 @@ from tkinter import ttk, filedialog, messagebox, scrolledtext
 import ftplib
 import os
 import threading
+import queue
 import json
+import re
+import sqlite3
+import errno
+import hashlib
 from datetime import datetime
 from pathlib import Path
 import socket
+import ssl
+import select
+import struct
+import tarfile
+import gzip
+import bz2
+import lzma
+import sys
+import time
+import ctypes
+import ctypes.util
+import argparse
+import multiprocessing
+import cProfile
+import pstats
+import tracemalloc
+import traceback
+import io
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+import posixpath
+import bisect
+import heapq
+from array import array
+
+
+# ==================== CONNECTIONS ====================
+
+DNS_TTL = 300
+CONNECT_ATTEMPT_DELAY = 0.25
+
+_dns_cache = {}
+_pasv_only = set()
+_net_lock = threading.Lock()
+
+
+def resolve_host(host, port, refresh=False):
+    """Resolve a host to TCP addresses, cached for DNS_TTL seconds.
+
+    Addresses alternate between IPv6 and IPv4 (IPv6 first) so that a
+    broken family never holds up the other for long (RFC 8305).
+    """
+    key = (host.lower(), port)
+    now = time.monotonic()
+    with _net_lock:
+        entry = _dns_cache.get(key)
+    if entry and not refresh and entry[0] > now:
+        return entry[1]
+    
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    v6 = [info for info in infos if info[0] == socket.AF_INET6]
+    v4 = [info for info in infos if info[0] != socket.AF_INET6]
+    ordered = []
+    seen = set()
+    for i in range(max(len(v6), len(v4))):
+        for family in (v6, v4):
+            if i < len(family) and family[i][4] not in seen:
+                seen.add(family[i][4])
+                ordered.append(family[i])
+    
+    with _net_lock:
+        _dns_cache[key] = (now + DNS_TTL, ordered)
+    return ordered
+
+
+def forget_host(host, port):
+    """Drop cached DNS results for a host"""
+    with _net_lock:
+        _dns_cache.pop((host.lower(), port), None)
+
+
+def happy_eyeballs_connect(host, port, timeout=None, delay=CONNECT_ATTEMPT_DELAY):
+    """Connect to the first reachable address of a host.
+
+    A new attempt starts every ``delay`` seconds, or as soon as the
+    previous one fails, while earlier attempts stay pending. The first
+    connection to complete wins and the others are closed.
+    """
+    addrs = resolve_host(host, port)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = {}
+    errors = []
+    winner = None
+    index = 0
+    next_start = time.monotonic()
+    
+    try:
+        while winner is None:
+            now = time.monotonic()
+            if index < len(addrs) and (now >= next_start or not pending):
+                family, socktype, proto, _, sockaddr = addrs[index]
+                index += 1
+                try:
+                    sock = socket.socket(family, socktype, proto)
+                except OSError as e:
+                    errors.append(e)
+                    continue
+                sock.setblocking(False)
+                err = sock.connect_ex(sockaddr)
+                if err == 0:
+                    winner = sock
+                elif err in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+                    pending[sock] = sockaddr
+                    next_start = now + delay
+                else:
+                    sock.close()
+                    errors.append(OSError(err, os.strerror(err)))
+                continue
+            
+            if not pending:
+                break
+            wait = next_start - now if index < len(addrs) else None
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    errors.append(socket.timeout("timed out"))
+                    break
+                wait = remaining if wait is None else min(wait, remaining)
+            
+            # Windows reports failed connects as exceptional, not writable
+            _, writable, failed = select.select([], list(pending), list(pending), wait)
+            for sock in set(writable) | set(failed):
+                del pending[sock]
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0 and winner is None:
+                    winner = sock
+                    continue
+                sock.close()
+                if err:
+                    errors.append(OSError(err, os.strerror(err)))
+                    next_start = now
+    finally:
+        for sock in pending:
+            sock.close()
+    
+    if winner is None:
+        forget_host(host, port)
+        if errors:
+            raise errors[-1]
+        raise OSError(f"No addresses found for {host}")
+    winner.settimeout(timeout)
+    return winner
+
+
+class _FastConnectMixin:
+    """Happy-eyeballs control connection and EPSV-first data channels"""
+    
+    def connect(self, host='', port=0, timeout=-999, source_address=None):
+        """Connect to the host, racing its IPv6 and IPv4 addresses"""
+        if source_address is not None or self.source_address is not None:
+            return super().connect(host, port, timeout, source_address)
+        if host != '':
+            self.host = host
+        if port > 0:
+            self.port = port
+        if timeout != -999:
+            self.timeout = timeout
+        if self.timeout is not None and not self.timeout:
+            raise ValueError('Non-blocking socket (timeout=0) is not supported')
+        self.sock = happy_eyeballs_connect(self.host, self.port, self.timeout)
+        self.af = self.sock.family
+        self.file = self.sock.makefile('r', encoding=self.encoding)
+        self.welcome = self.getresp()
+        return self.welcome
+    
+    def makepasv(self):
+        """Open a passive data channel with EPSV, remembering servers that need PASV"""
+        key = (self.host.lower(), self.port)
+        if self.af == socket.AF_INET and key in _pasv_only:
+            return super().makepasv()
+        try:
+            return ftplib.parse229(self.sendcmd('EPSV'), self.sock.getpeername())
+        except (ftplib.error_perm, ftplib.error_reply, ftplib.error_proto):
+            if self.af != socket.AF_INET:
+                raise
+            with _net_lock:
+                _pasv_only.add(key)
+            return super().makepasv()
+
+
+class FTPClient(_FastConnectMixin, ftplib.FTP):
+    """Plain FTP client with fast connection setup"""
+
+
+class FTPTLSClient(_FastConnectMixin, ftplib.FTP_TLS):
+    """Explicit FTPS client with fast connection setup"""
+
+
+# ==================== TRANSFER HELPERS ====================
+
+BLOCK_SIZE = 256 * 1024
+SENDFILE_CHUNK = 4 * 1024 * 1024
+
+
+def _close_data_conn(conn):
+    """Shut down a data connection, unwrapping TLS first if needed"""
+    try:
+        if isinstance(conn, ssl.SSLSocket):
+            conn.unwrap()
+    finally:
+        conn.close()
+
+
+def _send_file(conn, f, callback=None, length=None):
+    """Send a file from its current position over an open data connection.
+
+    Plain data connections hand the file descriptor to socket.sendfile()
+    so the kernel copies the data; TLS connections read into one reusable
+    buffer and send slices of it. ``length`` stops after that many bytes
+    instead of at the end of the file.
+    """
+    remaining = length
+    if not isinstance(conn, ssl.SSLSocket):
+        offset = f.tell()
+        while remaining is None or remaining > 0:
+            count = SENDFILE_CHUNK if remaining is None else min(SENDFILE_CHUNK, remaining)
+            sent = conn.sendfile(f, offset, count)
+            if not sent:
+                break
+            offset += sent
+            if remaining is not None:
+                remaining -= sent
+            if callback:
+                callback(sent)
+    else:
+        buf = bytearray(BLOCK_SIZE)
+        view = memoryview(buf)
+        while remaining is None or remaining > 0:
+            n = f.readinto(view if remaining is None else view[:min(BLOCK_SIZE, remaining)])
+            if not n:
+                break
+            conn.sendall(view[:n])
+            if remaining is not None:
+                remaining -= n
+            if callback:
+                callback(n)
+
+
+def stor_file(ftp, cmd, f, callback=None, rest=None, length=None):
+    """Upload an open binary file without per-block allocations"""
+    ftp.voidcmd('TYPE I')
+    conn = ftp.transfercmd(cmd, rest)
+    try:
+        _send_file(conn, f, callback, length)
+    finally:
+        _close_data_conn(conn)
+    return ftp.voidresp()
+
+
+def retr_file(ftp, cmd, write, callback=None, rest=None):
+    """Download into a preallocated buffer using recv_into().
+
+    ``write`` receives a memoryview slice that is only valid until it
+    returns, so it must copy or write the data out immediately.
+    """
+    ftp.voidcmd('TYPE I')
+    conn = ftp.transfercmd(cmd, rest)
+    buf = bytearray(BLOCK_SIZE)
+    view = memoryview(buf)
+    try:
+        while True:
+            n = conn.recv_into(buf)
+            if not n:
+                break
+            write(view[:n])
+            if callback:
+                callback(n)
+    finally:
+        _close_data_conn(conn)
+    return ftp.voidresp()
+
+
+def open_session(settings, timeout=30):
+    """Open and log in a new FTP session from a connection settings dict"""
+    ftp = FTPTLSClient() if settings.get('tls') else FTPClient()
+    try:
+        ftp.connect(settings['host'], int(settings.get('port') or 21), timeout=timeout)
+        ftp.login(settings.get('username', ''), settings.get('password', ''))
+        if settings.get('tls'):
+            ftp.prot_p()  # Switch to secure data connection
+        ftp.set_pasv(settings.get('passive', True))
+    except Exception:
+        ftp.close()
+        raise
+    return ftp
+
+
+def settings_from_saved(conn):
+    """Build session settings from a saved connection entry"""
+    username = conn.get('username', '')
+    password = conn.get('password', '')
+    if conn.get('anonymous'):
+        username = "anonymous"
+        password = "anonymous@"
+    return {
+        'host': conn.get('host', '').strip(),
+        'port': int(conn.get('port') or 21),
+        'username': username,
+        'password': password,
+        'tls': conn.get('tls', False),
+        'passive': conn.get('passive', True)
+    }
+
+
+def list_remote_dir(ftp, path=""):
+    """List a remote directory as (name, is_dir, size, modify) tuples.
+
+    ``modify`` is the raw MLSD fact (YYYYMMDDHHMMSS) when the server
+    supports MLSD, otherwise the date text from the LIST line.
+    """
+    items = []
+    try:
+        # Try MLSD (modern)
+        for name, facts in ftp.mlsd(path):
+            if name in ['.', '..'] or facts.get('type') in ('cdir', 'pdir'):
+                continue
+            is_dir = facts.get('type') == 'dir'
+            size = 0 if is_dir else int(facts.get('size', 0))
+            items.append((name, is_dir, size, facts.get('modify', '')))
+    except ftplib.error_perm:
+        # Fallback to LIST
+        lines = []
+        ftp.dir(path, lines.append)
+        for line in lines:
+            parts = line.split(None, 8)
+            if len(parts) >= 9:
+                is_dir = line.startswith('d')
+                size = 0 if is_dir else int(parts[4])
+                name = parts[8]
+                if line.startswith('l'):
+                    name = name.split(' -> ', 1)[0]
+                items.append((name, is_dir, size, ' '.join(parts[5:8])))
+    return items
+
+
+class SessionPool:
+    """Pool of logged-in sessions for background work.
+
+    At most ``size`` sessions are handed out at once, and pools that share
+    a ``limiter`` semaphore also share a global cap; idle sessions are
+    checked with NOOP before reuse. Pooled sessions share no working
+    directory with the UI, so callers must use absolute paths.
+    """
+
+    # Errors after which a session cannot be trusted any more
+    BROKEN_ERRORS = (OSError, EOFError, ftplib.error_reply, ftplib.error_proto)
+
+    def __init__(self, settings, size=4, limiter=None):
+        self.settings = settings
+        self.size = size
+        self.limiter = limiter
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def acquire(self):
+        """Get a healthy session, opening a new one when none is idle"""
+        self._slots.acquire()
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return self._checkout()
+
+    def try_acquire(self):
+        """Get a session only if one can be had without waiting, else None"""
+        if not self._slots.acquire(blocking=False):
+            return None
+        if self.limiter is not None and not self.limiter.acquire(blocking=False):
+            self._slots.release()
+            return None
+        return self._checkout()
+
+    def _checkout(self):
+        """Hand out an idle or new session; the caller holds a slot"""
+        try:
+            while True:
+                with self._lock:
+                    if self._closed:
+                        raise RuntimeError("Session pool is closed")
+                    ftp = self._idle.pop() if self._idle else None
+                if ftp is None:
+                    return open_session(self.settings)
+                try:
+                    ftp.voidcmd('NOOP')
+                    return ftp
+                except ftplib.all_errors:
+                    ftp.close()
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def _release_slot(self):
+        if self.limiter is not None:
+            self.limiter.release()
+        self._slots.release()
+
+    def release(self, ftp, broken=False):
+        """Return a session to the pool"""
+        with self._lock:
+            if broken or self._closed:
+                ftp.close()
+            else:
+                self._idle.append(ftp)
+        self._release_slot()
+
+    @contextmanager
+    def session(self):
+        """Borrow a session for the duration of a with block"""
+        ftp = self.acquire()
+        broken = False
+        try:
+            yield ftp
+        except self.BROKEN_ERRORS:
+            broken = True
+            raise
+        finally:
+            self.release(ftp, broken)
+
+    def close(self):
+        """Log out all idle sessions; busy ones are closed on release"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for ftp in idle:
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                ftp.close()
+
+
+class WarmSessions:
+    """Logged-in sessions kept ready for recently used servers.
+
+    warm() opens a session in the background before it is needed and
+    put() parks one that is no longer in use; take() hands one out after
+    a NOOP check. At most ``max_sessions`` are kept, least recently used
+    go first, and sessions idle for over ``max_idle`` seconds are logged
+    out by prune().
+    """
+
+    def __init__(self, max_sessions=4, max_idle=120):
+        self.max_sessions = max_sessions
+        self.max_idle = max_idle
+        self._idle = OrderedDict()  # settings key -> (ftp, cwd, parked at)
+        self._pending = {}  # settings key -> Event set when warm() finishes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(settings):
+        return json.dumps(settings, sort_keys=True)
+
+    def warm(self, settings):
+        """Start logging in to a server unless a session is parked or on its way"""
+        key = self._key(settings)
+        with self._lock:
+            if key in self._idle or key in self._pending:
+                return
+            self._pending[key] = threading.Event()
+        threading.Thread(target=self._open, args=(key, settings), daemon=True).start()
+
+    def _open(self, key, settings):
+        ftp = None
+        try:
+            ftp = open_session(settings)
+            cwd = ftp.pwd()
+        except Exception:
+            if ftp is not None:
+                ftp.close()
+            ftp = None
+        with self._lock:
+            done = self._pending.pop(key)
+        if ftp is not None:
+            self.put(settings, ftp, cwd)
+        done.set()
+
+    def take(self, settings, wait=30):
+        """Return (ftp, cwd) for a healthy parked session, or None.
+
+        A session still being opened by warm() is waited for up to
+        ``wait`` seconds rather than opening a second one.
+        """
+        key = self._key(settings)
+        with self._lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            pending.wait(wait)
+        with self._lock:
+            parked = self._idle.pop(key, None)
+        if parked is None:
+            return None
+        
+        ftp, cwd, since = parked
+        if time.monotonic() - since <= self.max_idle:
+            try:
+                ftp.voidcmd('NOOP')
+                return ftp, cwd
+            except ftplib.all_errors:
+                pass
+        ftp.close()
+        return None
+
+    def put(self, settings, ftp, cwd):
+        """Park a logged-in session for reuse"""
+        key = self._key(settings)
+        with self._lock:
+            old = self._idle.pop(key, None)
+            self._idle[key] = (ftp, cwd, time.monotonic())
+            evicted = [old[0]] if old else []
+            while len(self._idle) > self.max_sessions:
+                evicted.append(self._idle.popitem(last=False)[1][0])
+        self._quit(evicted)
+
+    def prune(self):
+        """Log out sessions idle for longer than max_idle"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [key for key, (_, _, since) in self._idle.items()
+                     if now - since > self.max_idle]
+            expired = [self._idle.pop(key)[0] for key in stale]
+        self._quit(expired)
+
+    def close(self):
+        """Log out every parked session"""
+        with self._lock:
+            parked = [ftp for ftp, _, _ in self._idle.values()]
+            self._idle.clear()
+        self._quit(parked)
+
+    @staticmethod
+    def _quit(sessions):
+        """Log sessions out without blocking the caller"""
+        def quit_all():
+            for ftp in sessions:
+                try:
+                    ftp.quit()
+                except ftplib.all_errors:
+                    ftp.close()
+        if sessions:
+            threading.Thread(target=quit_all, daemon=True).start()
+
+
+class WriteBehindWriter:
+    """Download sink that keeps disk writes off the network thread.
+
+    Incoming data is copied into one of a fixed set of buffers; full
+    buffers are written by a background thread while the next one fills,
+    so memory use is bounded by ``buffers * buffer_size``. Data goes to a
+    ``.part`` file that is renamed over the destination on close().
+    """
+
+    FSYNC_POLICIES = ('never', 'close', 'always')
+
+    def __init__(self, path, size=0, buffer_size=4 * 1024 * 1024, buffers=2, fsync='close'):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.path = path
+        self.part_path = path + '.part'
+        self.fsync = fsync
+        self.written = 0
+        self._error = None
+        self._file = open(self.part_path, 'wb')
+        if size and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(self._file.fileno(), 0, size)
+            except OSError:
+                pass
+        
+        self._free = queue.Queue()
+        self._full = queue.Queue()
+        for _ in range(max(2, buffers)):
+            self._free.put(bytearray(buffer_size))
+        self._buf = self._free.get()
+        self._fill = 0
+        
+        self._thread = threading.Thread(target=self._writer_thread, daemon=True)
+        self._thread.start()
+
+    def _writer_thread(self):
+        """Write full buffers to disk and hand them back"""
+        while True:
+            item = self._full.get()
+            if item is None:
+                break
+            buf, length = item
+            if self._error is None:
+                try:
+                    self._file.write(memoryview(buf)[:length])
+                    if self.fsync == 'always':
+                        self._file.flush()
+                        os.fsync(self._file.fileno())
+                except Exception as e:
+                    self._error = e
+            self._free.put(buf)
+
+    def _hand_off(self):
+        """Queue the current buffer for writing and take a free one"""
+        if self._fill:
+            self._full.put((self._buf, self._fill))
+            self._buf = self._free.get()
+            self._fill = 0
+
+    def write(self, data):
+        """Copy data into the current buffer, blocking only when all buffers are full"""
+        if self._error is not None:
+            raise self._error
+        data = memoryview(data)
+        while data:
+            n = min(len(data), len(self._buf) - self._fill)
+            self._buf[self._fill:self._fill + n] = data[:n]
+            self._fill += n
+            self.written += n
+            data = data[n:]
+            if self._fill == len(self._buf):
+                self._hand_off()
+
+    def close(self):
+        """Flush pending buffers and atomically move the file into place"""
+        self._hand_off()
+        self._full.put(None)
+        self._thread.join()
+        try:
+            if self._error is not None:
+                raise self._error
+            self._file.truncate(self.written)
+            self._file.flush()
+            if self.fsync != 'never':
+                os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self.part_path, self.path)
+        except Exception:
+            self.abort()
+            raise
+
+    def abort(self):
+        """Discard the partial download"""
+        if self._thread.is_alive():
+            self._full.put(None)
+            self._thread.join()
+        self._file.close()
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# ==================== METADATA ====================
+
+PIPELINE_WINDOW = 64
+PIPELINE_PROBE_TIMEOUT = 5
+
+# Servers known to answer pipelined commands correctly, or not
+_pipelining = {}
+
+_METADATA_REPLY = {'SIZE': '213', 'MDTM': '213', 'MLST': '250'}
+
+
+class _PipelineMismatch(Exception):
+    """A reply did not belong to the command it was matched with"""
+
+
+def _parse_metadata(cmd, path, resp):
+    """Facts from a SIZE/MDTM/MLST reply; raises _PipelineMismatch on a stray reply"""
+    code = resp[:3]
+    if code[:1] in ('4', '5'):
+        return {}
+    if code != _METADATA_REPLY[cmd]:
+        raise _PipelineMismatch(resp)
+    
+    body = resp[3:].strip()
+    if cmd == 'SIZE':
+        if not body.isdigit():
+            raise _PipelineMismatch(resp)
+        return {'size': int(body)}
+    if cmd == 'MDTM':
+        if not re.match(r'\d{14}', body):
+            raise _PipelineMismatch(resp)
+        return {'modify': body[:14]}
+    
+    for line in resp.splitlines()[1:]:
+        if line.startswith(' '):
+            facts_text, _, name = line[1:].partition(' ')
+            if posixpath.basename(name.rstrip('/')) != posixpath.basename(path.rstrip('/')):
+                raise _PipelineMismatch(resp)
+            facts = {}
+            for fact in facts_text.rstrip(';').split(';'):
+                key, _, value = fact.partition('=')
+                facts[key.lower()] = value
+            if 'size' in facts and facts['size'].isdigit():
+                facts['size'] = int(facts['size'])
+            return facts
+    raise _PipelineMismatch(resp)
+
+
+def _query_sequential(ftp, requests, result):
+    """One command and reply at a time"""
+    for path, cmd in requests:
+        ftp.putcmd(f'{cmd} {path}')
+        try:
+            result[path].update(_parse_metadata(cmd, path, ftp.getmultiline()))
+        except _PipelineMismatch:
+            pass
+
+
+def _pipelining_works(ftp):
+    """Probe once per server whether two commands sent together get two replies.
+
+    A server that drops the second command leaves the reply unanswered,
+    so the probe waits only PIPELINE_PROBE_TIMEOUT; the session is unusable
+    afterwards and the timeout propagates.
+    """
+    key = (ftp.host.lower(), ftp.port)
+    with _net_lock:
+        known = _pipelining.get(key)
+    if known is not None:
+        return known
+    
+    timeout = ftp.sock.gettimeout()
+    ftp.sock.settimeout(PIPELINE_PROBE_TIMEOUT)
+    try:
+        ftp.sock.sendall(b'NOOP\r\nNOOP\r\n')
+        # Read both replies before judging so the session stays in step
+        replies = [ftp.getmultiline(), ftp.getmultiline()]
+        works = all(reply[:1] == '2' for reply in replies)
+    except socket.timeout:
+        with _net_lock:
+            _pipelining[key] = False
+        raise
+    finally:
+        if ftp.sock is not None:
+            ftp.sock.settimeout(timeout)
+    with _net_lock:
+        _pipelining[key] = works
+    return works
+
+
+def query_metadata(ftp, paths, commands=('SIZE', 'MDTM')):
+    """Look up SIZE, MDTM and/or MLST facts for many remote paths.
+
+    Commands are written to the control connection PIPELINE_WINDOW at a
+    time before their replies are read and matched in order, so N lookups
+    cost about N / PIPELINE_WINDOW round trips. Servers that fail the
+    pipelining probe, or whose replies stop lining up with the commands,
+    are remembered and queried one command at a time.
+
+    Returns {path: facts}; facts may hold 'size', 'modify' and any other
+    MLST facts, and is empty for paths the server knows nothing about.
+    """
+    if any('\r' in path or '\n' in path for path in paths):
+        raise ValueError('an illegal newline character should not be contained')
+    if 'SIZE' in commands:
+        ftp.voidcmd('TYPE I')  # many servers refuse SIZE in ASCII mode
+    requests = [(path, cmd) for path in paths for cmd in commands]
+    result = {path: {} for path in paths}
+    if len(requests) < 2 or not _pipelining_works(ftp):
+        _query_sequential(ftp, requests, result)
+        return result
+    
+    done = 0
+    try:
+        while done < len(requests):
+            window = requests[done:done + PIPELINE_WINDOW]
+            ftp.sock.sendall(''.join(f'{cmd} {path}\r\n' for path, cmd in window)
+                             .encode(ftp.encoding))
+            try:
+                for path, cmd in window:
+                    result[path].update(_parse_metadata(cmd, path, ftp.getmultiline()))
+            except _PipelineMismatch:
+                # Read whatever is still owed, up to a NOOP marker
+                ftp.putcmd('NOOP')
+                while not ftp.getmultiline().startswith('200'):
+                    pass
+                raise
+            done += len(window)
+    except _PipelineMismatch:
+        with _net_lock:
+            _pipelining[(ftp.host.lower(), ftp.port)] = False
+        result = {path: {} for path in paths}
+        _query_sequential(ftp, requests, result)
+    return result
+
+
+# ==================== REMOTE INDEX ====================
+
+def _join_remote(parent, name):
+    """Join a remote directory path and an entry name"""
+    return parent.rstrip('/') + '/' + name
+
+
+class RemoteIndex:
+    """Persistent SQLite index of a remote directory tree.
+
+    Every crawl lists the whole tree, because a folder's ``modify`` fact
+    does not change when something deeper down does; an incremental crawl
+    only saves the writes for rows that are unchanged since last time.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            path TEXT PRIMARY KEY,
+            parent TEXT NOT NULL,
+            name TEXT NOT NULL,
+            is_dir INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            modify TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS entries_parent ON entries(parent);
+        CREATE INDEX IF NOT EXISTS entries_name ON entries(name COLLATE NOCASE);
+    """
+
+    # Trigram index over names for substring searches (SQLite 3.34+), kept
+    # in step with entries by triggers; user_version 1 marks it as filled
+    NAMES_SCHEMA = """
+        CREATE VIRTUAL TABLE entry_names USING fts5(
+            name, content='entries', content_rowid='rowid', tokenize='trigram');
+        CREATE TRIGGER entry_names_insert AFTER INSERT ON entries BEGIN
+            INSERT INTO entry_names(rowid, name) VALUES (new.rowid, new.name);
+        END;
+        CREATE TRIGGER entry_names_delete AFTER DELETE ON entries BEGIN
+            INSERT INTO entry_names(entry_names, rowid, name)
+            VALUES ('delete', old.rowid, old.name);
+        END;
+        CREATE TRIGGER entry_names_update AFTER UPDATE OF name ON entries BEGIN
+            INSERT INTO entry_names(entry_names, rowid, name)
+            VALUES ('delete', old.rowid, old.name);
+            INSERT INTO entry_names(rowid, name) VALUES (new.rowid, new.name);
+        END;
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as db:
+            db.executescript(self.SCHEMA)
+            self.trigram = db.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'entry_names'").fetchone() is not None
+            if not self.trigram:
+                empty = db.execute("SELECT 1 FROM entries LIMIT 1").fetchone() is None
+                try:
+                    db.executescript("BEGIN;" + self.NAMES_SCHEMA + "COMMIT;")
+                    self.trigram = True
+                except sqlite3.OperationalError:
+                    db.rollback()  # no FTS5 or trigram tokenizer in this SQLite
+                else:
+                    # Existing entries are added later by prepare(), off the UI thread
+                    if empty:
+                        db.execute("PRAGMA user_version = 1")
+
+    def prepare(self):
+        """Fill the name index of an index created before it existed (slow, once)"""
+        if not self.trigram:
+            return
+        db = self._connect()
+        try:
+            if db.execute("PRAGMA user_version").fetchone()[0] >= 1:
+                return
+            db.execute("BEGIN IMMEDIATE")
+            if db.execute("PRAGMA user_version").fetchone()[0] < 1:
+                db.execute("INSERT INTO entry_names(entry_names) VALUES ('rebuild')")
+                db.execute("PRAGMA user_version = 1")
+            db.commit()
+        finally:
+            db.close()
+
+    def _connect(self):
+        """Open a connection; each thread uses its own"""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _remove_subtree(self, db, path):
+        """Remove an entry and everything below it"""
+        prefix = path.rstrip('/') + '/'
+        db.execute("DELETE FROM entries WHERE path = ? OR substr(path, 1, ?) = ?",
+                   (path, len(prefix), prefix))
+
+    @staticmethod
+    def _list(ftp, path):
+        """List a directory for crawling as (own id, entries).
+
+        Entries are (name, is_dir, size, modify, id) tuples, where the id is
+        the MLSD ``unique`` fact and None when the server has none.
+        """
+        items = []
+        own = None
+        try:
+            for name, facts in ftp.mlsd(path):
+                kind = facts.get('type', '').lower()
+                if kind == 'cdir':
+                    own = facts.get('unique')
+                if name in ('.', '..') or kind in ('cdir', 'pdir'):
+                    continue
+                # Links reported as such (OS.unix=slink:...) are not followed
+                is_dir = kind == 'dir'
+                size = 0 if is_dir else int(facts.get('size', 0))
+                items.append((name, is_dir, size, facts.get('modify', ''), facts.get('unique')))
+        except ftplib.error_perm:
+            items = [item + (None,) for item in list_remote_dir(ftp, path)]
+        return own, items
+
+    def crawl(self, ftp, root='/', full=False, cancel=None, progress=None):
+        """Walk the remote tree from root and bring the index up to date.
+
+        Unchanged rows are left alone unless ``full`` is set. Folders whose
+        MLSD ``unique`` fact was already seen, such as symlinks back up the
+        tree, are not entered again. Returns the number of directories that
+        were listed.
+        """
+        self.prepare()
+        db = self._connect()
+        listed = 0
+        visited = set()
+        try:
+            stack = [root]
+            while stack:
+                if cancel is not None and cancel.is_set():
+                    break
+                path = stack.pop()
+                try:
+                    own, items = self._list(ftp, path)
+                except ftplib.error_perm:
+                    continue
+                if own is not None:
+                    visited.add(own)
+
+                known = {row[0]: row[1:] for row in db.execute(
+                    "SELECT name, is_dir, size, modify FROM entries WHERE parent = ?", (path,))}
+                seen = set()
+                for name, is_dir, size, modify, unique in items:
+                    seen.add(name)
+                    child = _join_remote(path, name)
+                    if full or known.get(name) != (int(is_dir), size, modify):
+                        db.execute("""
+                            INSERT INTO entries (path, parent, name, is_dir, size, modify)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(path) DO UPDATE SET
+                                is_dir = excluded.is_dir, size = excluded.size,
+                                modify = excluded.modify
+                        """, (child, path, name, int(is_dir), size, modify))
+                    if not is_dir:
+                        continue
+                    if unique is not None:
+                        if unique in visited:
+                            continue
+                        visited.add(unique)
+                    stack.append(child)
+
+                for name in set(known) - seen:
+                    self._remove_subtree(db, _join_remote(path, name))
+                db.commit()
+
+                listed += 1
+                if progress:
+                    progress(listed, path)
+        finally:
+            db.commit()
+            db.close()
+        return listed
+
+    def search(self, pattern="*", min_size=None, max_size=None,
+               modified_after=None, limit=1000):
+        """Find entries by name glob, size range and modification date.
+
+        ``modified_after`` is a YYYYMMDD[HHMMSS] string compared against
+        MLSD modify facts.
+        """
+        if not any(c in pattern for c in '*?['):
+            pattern = f"*{pattern}*"
+        columns = "e.path, e.is_dir, e.size, e.modify"
+        # Literal runs of 3+ characters can be looked up in the trigram index
+        literals = [run for run in re.split(r'\*|\?|\[[^\]]*\]?', pattern) if len(run) >= 3]
+        args = []
+        if not re.match(r'[*?\[]', pattern):
+            # A fixed prefix narrows the NOCASE name index to a range
+            prefix = re.match(r'[^*?\[]*', pattern).group(0)
+            like = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            query = f"SELECT {columns} FROM entries e WHERE e.name LIKE ? ESCAPE '\\'"
+            args.append(like)
+        elif literals and self.trigram and self._names_ready():
+            phrases = ' AND '.join('"' + run.replace('"', '""') + '"' for run in literals)
+            query = (f"SELECT {columns} FROM entry_names JOIN entries e ON e.rowid = entry_names.rowid "
+                     "WHERE entry_names MATCH ?")
+            args.append(phrases)
+        else:
+            query = f"SELECT {columns} FROM entries e WHERE 1"
+        query += " AND lower(e.name) GLOB ?"
+        args.append(pattern.lower())
+        if min_size is not None:
+            query += " AND e.size >= ?"
+            args.append(min_size)
+        if max_size is not None:
+            query += " AND e.size <= ?"
+            args.append(max_size)
+        if modified_after:
+            query += " AND e.modify >= ?"
+            args.append(modified_after)
+        # Sorting in SQL would visit every match before LIMIT applies
+        query += " LIMIT ?"
+        args.append(limit)
+        
+        db = self._connect()
+        try:
+            return sorted(db.execute(query, args).fetchall())
+        finally:
+            db.close()
+
+    def _names_ready(self):
+        db = self._connect()
+        try:
+            return db.execute("PRAGMA user_version").fetchone()[0] >= 1
+        finally:
+            db.close()
+
+    def count(self):
+        """Number of indexed entries"""
+        db = self._connect()
+        try:
+            return db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        finally:
+            db.close()
+
+
+# ==================== DIGEST CACHE ====================
+
+_SHA256_RE = re.compile(r'\b[0-9a-fA-F]{64}\b')
+
+
+def _hash_file(path):
+    """SHA-256 of a local file, or None if it cannot be read"""
+    digest = hashlib.sha256()
+    buf = bytearray(BLOCK_SIZE)
+    view = memoryview(buf)
+    try:
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                digest.update(view[:n])
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+REMOTE_DIGEST_COMMANDS = ('HASH', 'XSHA256')
+
+
+def remote_digest(ftp, path, commands):
+    """Ask the server for a file's SHA-256.
+
+    ``commands`` lists the checksum commands still worth trying; ones the
+    server rejects are removed from it. HASH only qualifies after
+    ``OPTS HASH SHA-256`` has been accepted. Returns None if none work.
+    """
+    while commands:
+        try:
+            match = _SHA256_RE.search(ftp.sendcmd(f'{commands[0]} {path}'))
+        except (ftplib.error_perm, ftplib.error_reply):
+            match = None
+        if match:
+            return match.group(0).lower()
+        commands.pop(0)
+    return None
+
+
+def server_key(settings):
+    """Identify a server account in persistent caches"""
+    return f"{settings['username']}@{settings['host']}:{settings['port']}"
+
+
+class DigestCache:
+    """Persistent SQLite cache of local file digests.
+
+    A file is only hashed again when its inode, size or mtime changes, and
+    hashing of changed files is spread over a process pool. The cache also
+    remembers the digest last uploaded to each remote path, so unchanged
+    files can be recognised without asking the server.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            inode INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            mtime INTEGER NOT NULL,
+            digest TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS uploads (
+            server TEXT NOT NULL,
+            remote TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            digest TEXT NOT NULL,
+            PRIMARY KEY (server, remote)
+        );
+    """
+    
+    # Fewer changed files than this are hashed without starting processes
+    POOL_THRESHOLD = 16
+
+    def __init__(self, db_path, workers=None):
+        self.db_path = db_path
+        self.workers = workers
+        with self._connect() as db:
+            db.executescript(self.SCHEMA)
+
+    def _connect(self):
+        """Open a connection; each thread uses its own"""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    @staticmethod
+    def _stat_key(path):
+        st = os.stat(path)
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def digests(self, paths):
+        """Return {path: (size, digest)}, hashing only files that changed"""
+        result = {}
+        stale = []
+        db = self._connect()
+        try:
+            for path in paths:
+                try:
+                    key = self._stat_key(path)
+                except OSError:
+                    continue
+                row = db.execute("SELECT inode, size, mtime, digest FROM files WHERE path = ?",
+                                 (path,)).fetchone()
+                if row and tuple(row[:3]) == key:
+                    result[path] = (key[1], row[3])
+                else:
+                    stale.append((path, key))
+            
+            if not stale:
+                return result
+            names = [path for path, _ in stale]
+            executor = None
+            if len(stale) < self.POOL_THRESHOLD:
+                hashed = map(_hash_file, names)
+            else:
+                # Forking a process that runs Tk and network threads is unsafe
+                executor = ProcessPoolExecutor(self.workers,
+                                               mp_context=multiprocessing.get_context('spawn'))
+                hashed = executor.map(_hash_file, names, chunksize=32)
+            try:
+                for (path, key), digest in zip(stale, hashed):
+                    if digest is None:
+                        continue
+                    result[path] = (key[1], digest)
+                    db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                               (path,) + key + (digest,))
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+                db.commit()
+            return result
+        finally:
+            db.close()
+
+    def lookup(self, path):
+        """Cached (size, digest) of a file if it has not changed since, else None"""
+        try:
+            key = self._stat_key(path)
+        except OSError:
+            return None
+        db = self._connect()
+        try:
+            row = db.execute("SELECT inode, size, mtime, digest FROM files WHERE path = ?",
+                             (path,)).fetchone()
+        finally:
+            db.close()
+        if row and tuple(row[:3]) == key:
+            return key[1], row[3]
+        return None
+
+    def remembered(self, server, remote_paths):
+        """Return {remote_path: (size, digest)} for files uploaded before"""
+        result = {}
+        db = self._connect()
+        try:
+            for remote_path in remote_paths:
+                row = db.execute("SELECT size, digest FROM uploads WHERE server = ? AND remote = ?",
+                                 (server, remote_path)).fetchone()
+                if row:
+                    result[remote_path] = tuple(row)
+        finally:
+            db.close()
+        return result
+
+    def remember(self, server, uploads):
+        """Record (remote_path, size, digest) of files now on the server"""
+        db = self._connect()
+        try:
+            with db:
+                db.executemany("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?)",
+                               ((server,) + tuple(upload) for upload in uploads))
+        finally:
+            db.close()
+
+
+# ==================== LISTING PREFETCH ====================
+
+class ListingCache:
+    """Bounded LRU cache of remote directory listings"""
+
+    def __init__(self, max_entries=200, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Return a fresh cached listing or None"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            stored, items = entry
+            if time.monotonic() - stored > self.ttl:
+                del self._entries[path]
+                return None
+            self._entries.move_to_end(path)
+            return items
+
+    def put(self, path, items):
+        with self._lock:
+            self._entries[path] = (time.monotonic(), items)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path=None):
+        """Forget one listing, or all of them"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+class Prefetcher:
+    """List likely next directories in the background.
+
+    Hints are served most-recent-first by up to ``workers`` threads, and
+    only on pooled sessions that are free right now, so prefetching never
+    delays transfers waiting for a connection.
+    """
+
+    def __init__(self, pool, cache, workers=2):
+        self.pool = pool
+        self.cache = cache
+        self._wanted = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        for _ in range(workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def hint(self, paths):
+        """Ask for paths to be listed; later hints take priority"""
+        with self._cond:
+            for path in paths:
+                if path in self._wanted:
+                    self._wanted.remove(path)
+                if self.cache.get(path) is None:
+                    self._wanted.append(path)
+            del self._wanted[:-self.cache.max_entries]
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._wanted = []
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._stopped and not self._wanted:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                path = self._wanted.pop()
+            if self.cache.get(path) is not None:
+                continue
+            try:
+                ftp = self.pool.try_acquire()
+            except Exception:
+                ftp = None
+            if ftp is None:
+                # No idle connection; try again shortly
+                with self._cond:
+                    if path not in self._wanted:
+                        self._wanted.insert(0, path)
+                    self._cond.wait(0.5)
+                continue
+            broken = False
+            try:
+                self.cache.put(path, DirectoryModel.from_listing(list_remote_dir(ftp, path)))
+            except SessionPool.BROKEN_ERRORS:
+                broken = True
+            except ftplib.all_errors:
+                pass
+            finally:
+                self.pool.release(ftp, broken)
+
+
+# ==================== REMOTE FILES ====================
+
+class RemoteFile(io.RawIOBase):
+    """Seekable, read-only file object over a remote file.
+
+    Reads are served from an LRU cache of fixed-size blocks. Each run of
+    missing blocks is fetched with one REST + RETR that is cut off as soon
+    as the run has arrived, so reading a few kilobytes of a huge file only
+    transfers about that much. ``source`` is an FTP session or a
+    SessionPool to borrow one from for each fetch.
+    """
+
+    BLOCK_SIZE = 64 * 1024
+    CACHE_BLOCKS = 64
+
+    def __init__(self, source, path, size=None, block_size=BLOCK_SIZE, cache_blocks=CACHE_BLOCKS):
+        super().__init__()
+        self.source = source
+        self.path = path
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.bytes_fetched = 0
+        self._pos = 0
+        self._blocks = OrderedDict()
+        if size is None:
+            with self._session() as ftp:
+                ftp.voidcmd('TYPE I')
+                size = ftp.size(path)
+        self.size = size
+
+    @contextmanager
+    def _session(self):
+        if isinstance(self.source, SessionPool):
+            with self.source.session() as ftp:
+                yield ftp
+        else:
+            yield self.source
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        end = min(self._pos + len(view), self.size)
+        n = 0
+        if self._pos < end:
+            bs = self.block_size
+            for index, block in self._blocks_between(self._pos // bs, (end - 1) // bs):
+                start = self._pos + n
+                stop = min(end, index * bs + len(block))
+                if stop <= start:
+                    break
+                view[n:n + stop - start] = block[start - index * bs:stop - index * bs]
+                n += stop - start
+        self._pos += n
+        return n
+
+    def _blocks_between(self, first, last):
+        """Yield (index, bytes) for blocks first..last, fetching missing runs"""
+        index = first
+        while index <= last:
+            if index in self._blocks:
+                self._blocks.move_to_end(index)
+                yield index, self._blocks[index]
+                index += 1
+                continue
+            run_end = index
+            while run_end < last and run_end + 1 not in self._blocks:
+                run_end += 1
+            for fetched in self._fetch(index, run_end):
+                yield index, fetched
+                index += 1
+            if index <= run_end:
+                return  # the file ended early
+
+    def _fetch(self, first, last):
+        """Download blocks first..last with one ranged RETR"""
+        bs = self.block_size
+        wanted = (last - first + 1) * bs
+        data = bytearray()
+        with self._session() as ftp:
+            ftp.voidcmd('TYPE I')
+            conn = ftp.transfercmd(f'RETR {self.path}', first * bs if first else None)
+            try:
+                while len(data) < wanted:
+                    chunk = conn.recv(min(BLOCK_SIZE, wanted - len(data)))
+                    if not chunk:
+                        break
+                    data += chunk
+            finally:
+                try:
+                    _close_data_conn(conn)
+                except OSError:
+                    pass
+            # Cutting the transfer short usually gets a 426 instead of a 226
+            try:
+                ftp.voidresp()
+            except (ftplib.error_temp, ftplib.error_reply):
+                pass
+        
+        self.bytes_fetched += len(data)
+        blocks = []
+        for offset in range(0, len(data), bs):
+            block = bytes(data[offset:offset + bs])
+            self._blocks[first + len(blocks)] = block
+            blocks.append(block)
+        while len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+        return blocks
+
+
+# ==================== SITE TO SITE ====================
+
+class _FxpRefused(Exception):
+    """The servers would not open a data connection to each other"""
+
+
+def _abort_transfer(ftp):
+    """Abort a started transfer and read replies until the session is in step"""
+    ftp.putcmd('ABOR')
+    ftp.putcmd('NOOP')
+    while not ftp.getmultiline().startswith('200'):
+        pass
+
+
+def fxp_transfer(src, dst, src_path, dst_path):
+    """Copy a file directly between two servers (FXP).
+
+    The source is put into passive mode and the destination is told to
+    connect to it with PORT/EPRT, so the data never passes through this
+    client. Raises _FxpRefused if the servers will not connect to each
+    other; other refusals (a missing file, no permission) are raised as
+    ftplib errors once both sessions are back in step.
+    """
+    src.voidcmd('TYPE I')
+    dst.voidcmd('TYPE I')
+    
+    host = src.sock.getpeername()[0]
+    try:
+        if src.af == socket.AF_INET6:
+            port = ftplib.parse229(src.sendcmd('EPSV'), src.sock.getpeername())[1]
+            dst.sendeprt(host, port)
+        else:
+            port = ftplib.parse227(src.sendcmd('PASV'))[1]
+            if dst.af == socket.AF_INET6:
+                dst.sendeprt(host, port)
+            else:
+                dst.sendport(host, port)
+    except ftplib.error_perm as e:
+        raise _FxpRefused(str(e))
+    
+    dst.putcmd(f'STOR {dst_path}')
+    src.putcmd(f'RETR {src_path}')
+    # Read both replies before acting on either, or one session falls behind
+    dst_resp = dst.getmultiline()
+    src_resp = src.getmultiline()
+    if dst_resp[:1] == '1' and src_resp[:1] == '1':
+        src.voidresp()
+        return dst.voidresp()
+    
+    if src_resp[:1] == '1':
+        _abort_transfer(src)
+    if dst_resp[:1] == '1':
+        _abort_transfer(dst)
+        try:
+            dst.delete(dst_path)
+        except ftplib.error_perm:
+            pass
+    if dst_resp.startswith('425'):
+        raise _FxpRefused(dst_resp)
+    failed = dst_resp if dst_resp[:1] != '1' else src_resp
+    error = {'4': ftplib.error_temp, '5': ftplib.error_perm}.get(failed[:1], ftplib.error_reply)
+    raise error(failed)
+
+
+def relay_transfer(src, dst, src_path, dst_path, callback=None):
+    """Stream a file from one server to another through memory"""
+    src.voidcmd('TYPE I')
+    dst.voidcmd('TYPE I')
+    src_conn = src.transfercmd(f'RETR {src_path}')
+    try:
+        dst_conn = dst.transfercmd(f'STOR {dst_path}')
+    except Exception:
+        _close_data_conn(src_conn)
+        try:
+            src.voidresp()
+        except ftplib.all_errors:
+            pass
+        raise
+    
+    buf = bytearray(BLOCK_SIZE)
+    view = memoryview(buf)
+    try:
+        while True:
+            n = src_conn.recv_into(buf)
+            if not n:
+                break
+            dst_conn.sendall(view[:n])
+            if callback:
+                callback(n)
+    finally:
+        _close_data_conn(src_conn)
+        _close_data_conn(dst_conn)
+    src.voidresp()
+    return dst.voidresp()
+
+
+def site_to_site(src, dst, src_path, dst_path, callback=None):
+    """Copy between servers with FXP, relaying through memory if refused.
+
+    Returns 'fxp' or 'relay' depending on the path that was used.
+    """
+    secure = isinstance(src, ftplib.FTP_TLS) or isinstance(dst, ftplib.FTP_TLS)
+    if not secure:
+        try:
+            fxp_transfer(src, dst, src_path, dst_path)
+            return 'fxp'
+        except _FxpRefused:
+            pass
+    relay_transfer(src, dst, src_path, dst_path, callback)
+    return 'relay'
+
+
+# ==================== BUNDLES ====================
+
+BUNDLE_SUFFIXES = (
+    ('.tar.gz', 'gz'), ('.tgz', 'gz'), ('.tar.bz2', 'bz2'),
+    ('.tar.xz', 'xz'), ('.tar', ''),
+)
+# Compressions offered for new bundles, as (label, suffix)
+BUNDLE_FORMATS = (('gzip', '.tar.gz'), ('None', '.tar'))
+# Zstandard only where this Python's tarfile can handle it (3.14+)
+if 'zst' in getattr(tarfile.TarFile, 'OPEN_METH', {}):
+    BUNDLE_SUFFIXES = (('.tar.zst', 'zst'),) + BUNDLE_SUFFIXES
+    BUNDLE_FORMATS = (('Zstandard', '.tar.zst'),) + BUNDLE_FORMATS
+
+# Decompressing ahead of tarfile keeps its stream buffer small; tarfile's
+# own decompression slices one large buffer per 512-byte block
+_BUNDLE_READERS = {
+    'gz': lambda f: gzip.GzipFile(fileobj=f, mode='rb'),
+    'bz2': bz2.BZ2File,
+    'xz': lzma.LZMAFile,
+}
+
+
+def bundle_compression(name):
+    """Compression implied by a bundle's file name, or None if it is not a tar"""
+    lower = name.lower()
+    for suffix, compression in BUNDLE_SUFFIXES:
+        if lower.endswith(suffix):
+            return compression
+    return None
+
+
+class _DataStream:
+    """File object over a data connection for tarfile's stream modes"""
+
+    def __init__(self, conn, callback=None):
+        self.conn = conn
+        self.callback = callback
+
+    def write(self, data):
+        self.conn.sendall(data)
+        if self.callback:
+            self.callback(len(data))
+        return len(data)
+
+    def read(self, size=BLOCK_SIZE):
+        data = self.conn.recv(size)
+        if data and self.callback:
+            self.callback(len(data))
+        return data
+
+
+def _extract_bundle(tar, local_dir):
+    """Extract a streamed archive, refusing links and paths outside local_dir"""
+    if hasattr(tarfile, 'data_filter'):
+        tar.extractall(local_dir, filter='data')
+        return
+    root = os.path.realpath(local_dir)
+    for member in tar:
+        target = os.path.realpath(os.path.join(root, member.name))
+        if not (member.isfile() or member.isdir()):
+            continue
+        if os.path.commonpath([root, target]) != root:
+            continue
+        tar.extract(member, root)
+
+
+def upload_bundle(ftp, local_dir, remote_path, callback=None):
+    """Upload a folder as one tar stream with a single STOR.
+
+    The archive is produced while it is sent, so nothing is written to
+    disk and only tarfile's block buffer is held in memory. The file name
+    picks the compression (.tar, .tar.gz, .tar.xz, ...).
+    """
+    mode = 'w|' + (bundle_compression(remote_path) or '')
+    ftp.voidcmd('TYPE I')
+    conn = ftp.transfercmd(f'STOR {remote_path}')
+    try:
+        with tarfile.open(fileobj=_DataStream(conn, callback), mode=mode,
+                          bufsize=BLOCK_SIZE) as tar:
+            tar.add(local_dir, arcname=os.path.basename(os.path.normpath(local_dir)))
+    finally:
+        _close_data_conn(conn)
+    return ftp.voidresp()
+
+
+def download_bundle(ftp, remote_path, local_dir, callback=None):
+    """Download a tar bundle and extract it as it arrives"""
+    reader = _BUNDLE_READERS.get(bundle_compression(remote_path))
+    ftp.voidcmd('TYPE I')
+    conn = ftp.transfercmd(f'RETR {remote_path}')
+    try:
+        stream = _DataStream(conn, callback)
+        if reader is not None:
+            with reader(stream) as source:
+                with tarfile.open(fileobj=source, mode='r|') as tar:
+                    _extract_bundle(tar, local_dir)
+        else:
+            with tarfile.open(fileobj=stream, mode='r|*') as tar:
+                _extract_bundle(tar, local_dir)
+        # Read past the end-of-archive padding so the server sees a clean close
+        while stream.read():
+            pass
+    finally:
+        _close_data_conn(conn)
+    return ftp.voidresp()
+
+
+# ==================== REPLICATION ====================
+
+class Replicator:
+    """Upload the same files to several servers, reading each one once.
+
+    Every block read from disk goes into one bounded queue per target and
+    a thread per target sends it over that server's STOR data connection.
+    The queues share the block objects, so at most ``buffer_blocks`` blocks
+    are held however many targets there are, and a full queue makes the
+    reader wait for the slowest server. Results are kept per target so the
+    files that failed on one server can be sent again on their own.
+    """
+
+    BUFFER_BLOCKS = 16
+
+    # Queue markers between file names (str) and data blocks (bytes)
+    _END = object()
+    _ABORT = object()
+
+    def __init__(self, targets, buffer_blocks=BUFFER_BLOCKS, block_size=BLOCK_SIZE,
+                 on_change=None):
+        self.targets = dict(targets)
+        self.buffer_blocks = buffer_blocks
+        self.block_size = block_size
+        self.on_change = on_change
+        self.files = []
+        self.results = {name: self._new_result() for name in self.targets}
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    @staticmethod
+    def _new_result():
+        return {'state': 'pending', 'done': 0, 'total': 0, 'bytes': 0, 'failed': {}}
+
+    def run(self, files, names=None):
+        """Send [(local_path, remote_path)] to the named targets (default all).
+
+        Blocks until every target has finished and returns
+        {name: {remote_path: error}} for the uploads that failed.
+        """
+        self.files = list(files)
+        names = list(names or self.targets)
+        with self._lock:
+            for name in names:
+                self.results[name] = self._new_result()
+        return self._replicate([(local, remote, names) for local, remote in self.files])
+
+    def retry(self, names=None):
+        """Send the files that failed on the named targets (default all) again"""
+        names = list(names or self.targets)
+        with self._lock:
+            failed = {name: dict(self.results[name]['failed']) for name in names}
+            for name in names:
+                result = self.results[name]
+                result['total'] -= len(failed[name])
+                result['failed'] = {}
+        plan = []
+        for local, remote in self.files:
+            wanted = [name for name in names if remote in failed[name]]
+            if wanted:
+                plan.append((local, remote, wanted))
+        return self._replicate(plan)
+
+    def cancel(self):
+        """Stop after the blocks already queued; unfinished uploads are removed"""
+        self._cancel.set()
+
+    def _replicate(self, plan):
+        self._cancel.clear()
+        names = sorted({name for _, _, wanted in plan for name in wanted})
+        queues = {name: queue.Queue(self.buffer_blocks) for name in names}
+        threads = [threading.Thread(target=self._target_thread, args=(name, queues[name]),
+                                    daemon=True) for name in names]
+        with self._lock:
+            for name in names:
+                self.results[name]['state'] = 'active'
+                self.results[name]['total'] += sum(name in wanted for _, _, wanted in plan)
+        for thread in threads:
+            thread.start()
+        
+        try:
+            for local, remote, wanted in plan:
+                if self._cancel.is_set():
+                    break
+                for name in wanted:
+                    queues[name].put(remote)
+                end = self._END
+                try:
+                    with open(local, 'rb') as f:
+                        while not self._cancel.is_set():
+                            block = f.read(self.block_size)
+                            if not block:
+                                break
+                            for name in wanted:
+                                queues[name].put(block)
+                    if self._cancel.is_set():
+                        end = self._ABORT
+                except OSError as e:
+                    end = e
+                for name in wanted:
+                    queues[name].put(end)
+        finally:
+            for name in names:
+                queues[name].put(None)
+            for thread in threads:
+                thread.join()
+        
+        with self._lock:
+            return {name: dict(self.results[name]['failed']) for name in names}
+
+    def _target_thread(self, name, blocks):
+        """Send queued files to one server over a single session"""
+        ftp = conn = remote = None
+        unreachable = None
+        made_dirs = set()
+        try:
+            while True:
+                item = blocks.get()
+                if item is None:
+                    break
+                if isinstance(item, str):
+                    remote = item
+                    if unreachable is not None:
+                        self._record(name, remote, unreachable)
+                        continue
+                    try:
+                        if ftp is None:
+                            try:
+                                ftp = open_session(self.targets[name])
+                            except Exception as e:
+                                unreachable = e
+                                raise
+                        self._ensure_remote_dir(ftp, posixpath.dirname(remote), made_dirs)
+                        ftp.voidcmd('TYPE I')
+                        conn = ftp.transfercmd(f'STOR {remote}')
+                    except Exception as e:
+                        ftp = self._drop_session(ftp)
+                        self._record(name, remote, e)
+                    continue
+                if conn is None:
+                    continue  # blocks of a file that already failed here
+                
+                error = None
+                try:
+                    if isinstance(item, bytes):
+                        conn.sendall(item)
+                        with self._lock:
+                            self.results[name]['bytes'] += len(item)
+                        continue
+                    _close_data_conn(conn)
+                    conn = None
+                    if item is self._END:
+                        ftp.voidresp()
+                    else:
+                        # Cancelled or the local read failed: drop the partial copy
+                        error = item if isinstance(item, Exception) else 'Cancelled'
+                        try:
+                            ftp.voidresp()
+                        except ftplib.all_errors:
+                            pass
+                        try:
+                            ftp.delete(remote)
+                        except ftplib.all_errors:
+                            pass
+                except Exception as e:
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+                    ftp = self._drop_session(ftp)
+                    error = e
+                self._record(name, remote, error)
+        finally:
+            if conn is not None:
+                conn.close()
+            if ftp is not None:
+                try:
+                    ftp.quit()
+                except ftplib.all_errors:
+                    ftp.close()
+            with self._lock:
+                result = self.results[name]
+                result['state'] = 'failed' if result['failed'] else 'done'
+            self._changed(name)
+
+    @staticmethod
+    def _ensure_remote_dir(ftp, remote_dir, made_dirs):
+        """Create missing remote parent folders"""
+        current = ''
+        for part in [p for p in remote_dir.split('/') if p]:
+            current += '/' + part
+            if current in made_dirs:
+                continue
+            try:
+                ftp.mkd(current)
+            except ftplib.error_perm:
+                pass
+            made_dirs.add(current)
+
+    @staticmethod
+    def _drop_session(ftp):
+        if ftp is not None:
+            ftp.close()
+        return None
+
+    def _record(self, name, remote, error=None):
+        with self._lock:
+            result = self.results[name]
+            if error is None:
+                result['done'] += 1
+            else:
+                result['failed'][remote] = str(error) or error.__class__.__name__
+        self._changed(name)
+
+    def _changed(self, name):
+        if self.on_change:
+            self.on_change(name)
+
+
+# ==================== SEGMENTED UPLOAD ====================
+
+SEGMENT_MIN_SIZE = 64 * 1024 * 1024
+
+# Servers that advertise REST STREAM, minus ones whose segmented uploads failed
+_segmented = {}
+
+
+def _segments_supported(ftp):
+    """Whether a server is worth a segmented upload, asking FEAT once"""
+    key = (ftp.host.lower(), ftp.port)
+    with _net_lock:
+        known = _segmented.get(key)
+    if known is not None:
+        return known
+    try:
+        features = ftp.sendcmd('FEAT').splitlines()[1:]
+    except (ftplib.error_perm, ftplib.error_reply):
+        features = []
+    supported = any(line.strip().upper() == 'REST STREAM' for line in features)
+    with _net_lock:
+        _segmented[key] = supported
+    return supported
+
+
+def _segments_failed(ftp):
+    with _net_lock:
+        _segmented[(ftp.host.lower(), ftp.port)] = False
+
+
+def _upload_matches(ftp, local_path, remote_path, size):
+    """Check an uploaded file's size, and its SHA-256 when the server can tell"""
+    ftp.voidcmd('TYPE I')
+    try:
+        if ftp.size(remote_path) != size:
+            return False
+    except ftplib.error_perm:
+        return False
+    commands = list(REMOTE_DIGEST_COMMANDS)
+    try:
+        ftp.sendcmd('OPTS HASH SHA-256')
+    except (ftplib.error_perm, ftplib.error_reply):
+        commands.remove('HASH')
+    digest = remote_digest(ftp, remote_path, commands)
+    return digest is None or digest == _hash_file(local_path)
+
+
+def segmented_upload(ftp, pool, local_path, remote_path, max_segments=4, callback=None):
+    """Upload a large file as byte ranges sent in parallel with REST + STOR.
+
+    ``ftp`` is a session the caller holds; up to max_segments - 1 more are
+    borrowed from ``pool`` without waiting, one per range. The first range
+    goes with a plain STOR that creates the file before the others start.
+    Ranges a server refuses (many reject REST past the end of the file)
+    are sent afterwards, in order, on ``ftp``. The result is checked by
+    size and SHA-256 where available; on a mismatch the server is not
+    segmented again and the file is sent as one stream.
+
+    Returns 'segmented', or 'single' when one stream was used.
+    """
+    size = os.path.getsize(local_path)
+    sessions = [ftp]
+    if min(max_segments, size // SEGMENT_MIN_SIZE) > 1 and _segments_supported(ftp):
+        while len(sessions) < min(max_segments, size // SEGMENT_MIN_SIZE):
+            extra = pool.try_acquire()
+            if extra is None:
+                break
+            sessions.append(extra)
+    if len(sessions) == 1:
+        with open(local_path, 'rb') as f:
+            stor_file(ftp, f'STOR {remote_path}', f, callback)
+        return 'single'
+    
+    lock = threading.Lock()
+    
+    def report(nbytes):
+        if callback:
+            with lock:
+                callback(nbytes)
+    
+    bounds = [size * i // len(sessions) for i in range(len(sessions) + 1)]
+    leftover = []
+    refused = []
+    
+    def send_range(session, index):
+        broken = False
+        try:
+            with open(local_path, 'rb') as f:
+                f.seek(bounds[index])
+                stor_file(session, f'STOR {remote_path}', f, report,
+                          rest=bounds[index], length=bounds[index + 1] - bounds[index])
+        except ftplib.all_errors as e:
+            broken = isinstance(e, SessionPool.BROKEN_ERRORS)
+            with lock:
+                leftover.append(index)
+                if isinstance(e, ftplib.error_perm):
+                    refused.append(index)
+        finally:
+            pool.release(session, broken)
+    
+    threads = []
+    try:
+        ftp.voidcmd('TYPE I')
+        conn = ftp.transfercmd(f'STOR {remote_path}')
+    except BaseException:
+        for session in sessions[1:]:
+            pool.release(session)
+        raise
+    for index, session in enumerate(sessions[1:], 1):
+        thread = threading.Thread(target=send_range, args=(session, index), daemon=True)
+        thread.start()
+        threads.append(thread)
+    try:
+        try:
+            with open(local_path, 'rb') as f:
+                _send_file(conn, f, report, bounds[1])
+        finally:
+            _close_data_conn(conn)
+        ftp.voidresp()
+    finally:
+        for thread in threads:
+            thread.join()
+    
+    if refused:
+        _segments_failed(ftp)
+    for index in sorted(leftover):
+        with open(local_path, 'rb') as f:
+            f.seek(bounds[index])
+            stor_file(ftp, f'STOR {remote_path}', f, report,
+                      rest=bounds[index], length=bounds[index + 1] - bounds[index])
+    
+    if _upload_matches(ftp, local_path, remote_path, size):
+        return 'segmented' if len(refused) < len(sessions) - 1 else 'single'
+    _segments_failed(ftp)
+    with open(local_path, 'rb') as f:
+        stor_file(ftp, f'STOR {remote_path}', f)
+    return 'single'
+
+
+# ==================== TRANSFER QUEUE ====================
+
+class MissingCredentials(Exception):
+    """A queued job's server has no known login details"""
+
+
+class TransferQueue:
+    """Persistent queue of upload and download jobs.
+
+    Jobs are stored in SQLite, one row each, and move through the states
+    pending, active, done and failed; finished jobs leave the store but
+    stay listed until cleared. Transient failures (4xx replies, timeouts,
+    dropped connections) are retried with exponential backoff; permanent
+    ones such as 550/553 fail the job straight away. Jobs that were
+    active when the application stopped are pending again after load().
+
+    Runnable jobs wait in a FIFO and retries in a heap ordered by their
+    next attempt, so taking a job does not scan the whole list. Jobs that
+    are removed are dropped from those lazily, when they come up.
+
+    Rows name their server by server_key() only. Login details come from
+    the settings given to add() during this run, or from ``credentials``
+    (a callable taking a server key) for jobs restored from disk.
+    """
+
+    MAX_ATTEMPTS = 6
+    RETRY_BASE = 5
+    RETRY_MAX = 300
+    UPLOAD_KINDS = ('upload', 'bundle_upload')
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            server TEXT NOT NULL,
+            local TEXT NOT NULL,
+            remote TEXT NOT NULL,
+            size INTEGER,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            next_try REAL NOT NULL,
+            error TEXT NOT NULL
+        );
+    """
+    COLUMNS = ('id', 'kind', 'server', 'local', 'remote', 'size',
+               'state', 'attempts', 'next_try', 'error')
+
+    def __init__(self, path, workers=2, writer_options=None, limiter=None,
+                 on_change=None, on_progress=None, upload_segments=1,
+                 credentials=None, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.workers = workers
+        self.upload_segments = upload_segments
+        self.limiter = limiter
+        self.writer_options = writer_options or {}
+        self.on_change = on_change
+        self.on_progress = on_progress
+        self.credentials = credentials
+        self.jobs = []
+        self._ready = deque()
+        self._delayed = []
+        self._next_id = 1
+        self._loaded = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._settings = {}
+        self._pools = {}
+        self._threads = []
+        self._db = None
+        self._db_lock = threading.Lock()
+
+    # Persistence
+    
+    def load(self):
+        """Read saved jobs and return how many are waiting to run"""
+        db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(self.SCHEMA)
+        saved = [dict(zip(self.COLUMNS, row)) for row in
+                 db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs ORDER BY id")]
+        legacy = self._load_legacy()
+        
+        with self._cond:
+            for job in saved:
+                if job['state'] == 'active':
+                    job['state'] = 'pending'
+                job['next_try'] = 0
+            self._next_id = max([job['id'] for job in saved] + [0]) + 1
+            for job in legacy + self.jobs:
+                job['id'] = self._next_id
+                self._next_id += 1
+            # Restored jobs run before ones added while loading
+            self._ready.extendleft(reversed([job for job in saved + legacy
+                                             if job['state'] == 'pending']))
+            self.jobs = saved + legacy + self.jobs
+            self._db = db
+            self._loaded = True
+            jobs = list(self.jobs)
+            self._cond.notify_all()
+        self._store(jobs)
+        if legacy:
+            try:
+                os.remove(self.legacy_path)
+            except OSError:
+                pass
+        return sum(1 for job in jobs if job['state'] == 'pending')
+
+    def _load_legacy(self):
+        """Jobs from the old JSON queue file, without their stored passwords"""
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return []
+        try:
+            with open(self.legacy_path, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return []
+        jobs = []
+        for job in saved:
+            if job.get('state') == 'done':
+                continue
+            settings = job.pop('settings')
+            job['server'] = server_key(settings)
+            self._settings.setdefault(job['server'], settings)
+            job.update(state='pending' if job['state'] == 'active' else job['state'], next_try=0)
+            jobs.append({column: job.get(column) for column in self.COLUMNS})
+        return jobs
+
+    def _store(self, jobs):
+        """Write jobs' rows; done jobs are removed from the store"""
+        if self._db is None:
+            return
+        rows = [tuple(job[column] for column in self.COLUMNS)
+                for job in jobs if job['state'] != 'done']
+        done = [(job['id'],) for job in jobs if job['state'] == 'done']
+        with self._db_lock:
+            try:
+                with self._db:
+                    self._db.executemany(
+                        f"INSERT OR REPLACE INTO jobs ({', '.join(self.COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * len(self.COLUMNS))})", rows)
+                    self._db.executemany("DELETE FROM jobs WHERE id = ?", done)
+            except sqlite3.Error:
+                pass
+
+    def _forget(self, job_ids):
+        """Delete jobs' rows"""
+        if self._db is None:
+            return
+        with self._db_lock:
+            try:
+                with self._db:
+                    self._db.executemany("DELETE FROM jobs WHERE id = ?",
+                                         [(job_id,) for job_id in job_ids])
+            except sqlite3.Error:
+                pass
+
+    # Job management
+    
+    def add(self, kind, settings, local_path, remote_path, size=None):
+        """Queue an 'upload', 'download', 'bundle_upload' or 'bundle_download' job.
+
+        ``size`` is the remote size of a download when it is already known.
+        """
+        return self.add_many(kind, settings, [(local_path, remote_path, size)])[0]
+
+    def add_many(self, kind, settings, items):
+        """Queue one job per (local_path, remote_path[, size]) in one write.
+
+        on_change is called once, with the last job, for the whole batch.
+        """
+        server = server_key(settings)
+        jobs = []
+        with self._cond:
+            self._settings[server] = settings
+            pool = self._pools.get(server)
+            if pool is not None and pool.settings != settings:
+                # Log in with the new details from now on
+                pool.close()
+                del self._pools[server]
+            for item in items:
+                local_path, remote_path = item[:2]
+                jobs.append({
+                    'id': self._next_id if self._loaded else 0,
+                    'kind': kind,
+                    'server': server,
+                    'local': local_path,
+                    'remote': remote_path,
+                    'state': 'pending',
+                    'attempts': 0,
+                    'next_try': 0,
+                    'error': '',
+                    'size': item[2] if len(item) > 2 else None
+                })
+                if self._loaded:
+                    self._next_id += 1
+            self.jobs.extend(jobs)
+            self._ready.extend(jobs)
+            self._cond.notify_all()
+        self._store(jobs)
+        if jobs:
+            self._changed(jobs[-1])
+        return jobs
+
+    def retry(self, job_ids):
+        """Put failed jobs back into the queue"""
+        with self._cond:
+            retried = []
+            for job in self.jobs:
+                if job['id'] in job_ids and job['state'] == 'failed':
+                    job.update(state='pending', attempts=0, next_try=0, error='')
+                    self._ready.append(job)
+                    retried.append(job)
+            self._cond.notify_all()
+        self._store(retried)
+
+    def remove(self, job_ids):
+        """Drop jobs that are not currently running"""
+        with self._cond:
+            removed = []
+            for job in self.jobs:
+                if job['id'] in job_ids and job['state'] != 'active':
+                    # Skipped if it is still waiting in _ready or _delayed
+                    job['state'] = 'removed'
+                    removed.append(job['id'])
+            self.jobs = [job for job in self.jobs
+                         if job['id'] not in job_ids or job['state'] == 'active']
+        self._forget(removed)
+
+    def clear_finished(self):
+        """Drop completed jobs"""
+        with self._cond:
+            self.jobs = [job for job in self.jobs if job['state'] != 'done']
+
+    # Workers
+    
+    def start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop taking new jobs; running ones are restored on next load"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for pool in self._pools.values():
+            pool.close()
+
+    def _take_job(self):
+        """Wait for the next runnable job and mark it active"""
+        job = None
+        with self._cond:
+            while not self._stopped:
+                timeout = None
+                if self._loaded:
+                    now = time.time()
+                    while self._delayed and self._delayed[0][0] <= now:
+                        self._ready.append(heapq.heappop(self._delayed)[2])
+                    while self._ready and self._ready[0]['state'] != 'pending':
+                        self._ready.popleft()
+                    if self._ready:
+                        job = self._ready.popleft()
+                        job['state'] = 'active'
+                        job['attempts'] += 1
+                        break
+                    if self._delayed:
+                        timeout = self._delayed[0][0] - now
+                self._cond.wait(timeout)
+        if job is not None:
+            self._store([job])
+        return job
+
+    def _pool(self, server):
+        """One session pool per server, logging in with its known settings"""
+        with self._cond:
+            if server not in self._pools:
+                settings = self._settings.get(server)
+                if settings is None and self.credentials:
+                    settings = self.credentials(server)
+                if settings is None:
+                    raise MissingCredentials(f"No login details for {server}; "
+                                             "connect to it and retry")
+                # Room for the extra sessions of segmented uploads
+                self._pools[server] = SessionPool(settings, self.workers + self.upload_segments - 1,
+                                                  self.limiter)
+            return self._pools[server]
+
+    def _worker(self):
+        while True:
+            job = self._take_job()
+            if job is None:
+                return
+            self._changed(job)
+            try:
+                self._run(job)
+                state, error = 'done', ''
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                if self._stopped:
+                    state = 'active'
+                elif self.is_transient(e) and job['attempts'] < self.MAX_ATTEMPTS:
+                    state = 'pending'
+                    delay = min(self.RETRY_BASE * 2 ** (job['attempts'] - 1), self.RETRY_MAX)
+                    job['next_try'] = time.time() + delay
+                else:
+                    state = 'failed'
+            with self._cond:
+                job['state'] = state
+                job['error'] = error
+                if state == 'pending':
+                    heapq.heappush(self._delayed, (job['next_try'], job['id'], job))
+                    self._cond.notify()
+            self._store([job])
+            self._changed(job)
+
+    def _run(self, job):
+        """Transfer one file"""
+        done = [0]
+        pool = self._pool(job['server'])
+        
+        with pool.session() as ftp:
+            if job['kind'] == 'upload':
+                size = os.path.getsize(job['local'])
+                
+                def callback(nbytes):
+                    done[0] += nbytes
+                    self._progress(job, done[0], size)
+                
+                if self.upload_segments > 1:
+                    segmented_upload(ftp, pool, job['local'], job['remote'],
+                                     self.upload_segments, callback)
+                    return
+                with open(job['local'], 'rb') as f:
+                    stor_file(ftp, f"STOR {job['remote']}", f, callback)
+            elif job['kind'] == 'bundle_upload':
+                upload_bundle(ftp, job['local'], job['remote'])
+            else:
+                size = job.get('size')
+                if size is None or job['attempts'] > 1:
+                    try:
+                        size = ftp.size(job['remote']) or 0
+                    except ftplib.all_errors:
+                        size = 0
+                
+                def callback(nbytes):
+                    done[0] += nbytes
+                    self._progress(job, done[0], size)
+                
+                if job['kind'] == 'bundle_download':
+                    os.makedirs(job['local'], exist_ok=True)
+                    download_bundle(ftp, job['remote'], job['local'], callback)
+                    return
+                with WriteBehindWriter(job['local'], size, **self.writer_options) as writer:
+                    retr_file(ftp, f"RETR {job['remote']}", writer.write, callback)
+
+    @staticmethod
+    def is_transient(error):
+        """Whether a failed transfer is worth retrying"""
+        if isinstance(error, ftplib.error_temp):
+            return True
+        if isinstance(error, (ftplib.error_perm, FileNotFoundError, PermissionError,
+                              IsADirectoryError, NotADirectoryError)):
+            return False
+        return isinstance(error, (OSError, EOFError, ftplib.error_reply, ftplib.error_proto))
+
+    def _changed(self, job):
+        if self.on_change:
+            self.on_change(job)
+
+    def _progress(self, job, done, size):
+        if self.on_progress and size:
+            self.on_progress(job, done * 100 / size)
+
+
+# ==================== RECURSIVE DELETE ====================
+
+class RecursiveDeleter:
+    """Delete remote trees using several pooled sessions in parallel.
+
+    Folders are listed concurrently, files are removed with DELE as soon
+    as they are found, and each folder is removed with RMD the moment its
+    last child is gone, so the tree is torn down bottom-up. Servers often
+    report a symlink to a folder as a plain folder, so every folder is
+    first tried with DELE and only listed when that is refused; a link is
+    removed itself and the tree it points to is never entered.
+    """
+
+    def __init__(self, pool, paths, workers=4, progress=None, cancel=None):
+        self.pool = pool
+        self.paths = paths
+        self.workers = workers
+        self.progress = progress
+        self.cancel = cancel or threading.Event()
+        self.files_deleted = 0
+        self.dirs_deleted = 0
+        self.errors = []
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+        self._remaining = {}
+        self._parents = {}
+
+    def run(self):
+        """Delete everything and block until done or cancelled"""
+        for path, is_dir in self.paths:
+            self._parents[path] = None
+            self._tasks.put(('dir' if is_dir else 'dele', path))
+
+        threads = [threading.Thread(target=self._worker, daemon=True)
+                   for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        self._tasks.join()
+        for _ in threads:
+            self._tasks.put(None)
+        for thread in threads:
+            thread.join()
+        return not self.cancel.is_set() and not self.errors
+
+    def _worker(self):
+        """Process tasks, borrowing a pooled session for each one.
+
+        No session is held while waiting for a task, so deleters and other
+        users sharing the pool cannot starve each other.
+        """
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                self._tasks.task_done()
+                break
+            try:
+                if not self.cancel.is_set():
+                    with self.pool.session() as ftp:
+                        self._execute(ftp, *task)
+            except Exception as e:
+                self._record_error(task[1], e)
+            finally:
+                self._tasks.task_done()
+
+    def _execute(self, ftp, action, path):
+        """Run a single folder, DELE or RMD step"""
+        if action == 'dir':
+            try:
+                ftp.delete(path)
+            except ftplib.error_perm:
+                # A real folder; anything DELE can remove is a link
+                self._list(ftp, path)
+            else:
+                with self._lock:
+                    self.files_deleted += 1
+                self._child_done(path)
+        elif action == 'dele':
+            try:
+                ftp.delete(path)
+                with self._lock:
+                    self.files_deleted += 1
+            finally:
+                self._child_done(path)
+        else:
+            try:
+                ftp.rmd(path)
+                with self._lock:
+                    self.dirs_deleted += 1
+            finally:
+                self._child_done(path)
+        if self.progress:
+            self.progress(self.files_deleted, self.dirs_deleted, len(self.errors))
+
+    def _list(self, ftp, path):
+        """Queue the children of a folder, or the folder itself if empty"""
+        items = list_remote_dir(ftp, path)
+        with self._lock:
+            self._remaining[path] = len(items)
+        if not items:
+            self._tasks.put(('rmd', path))
+        for name, is_dir, _, _ in items:
+            child = _join_remote(path, name)
+            self._parents[child] = path
+            self._tasks.put(('dir' if is_dir else 'dele', child))
+
+    def _child_done(self, path):
+        """Count a removed child and queue its folder once empty"""
+        parent = self._parents.pop(path, None)
+        if parent is None:
+            return
+        with self._lock:
+            self._remaining[parent] -= 1
+            empty = self._remaining[parent] == 0
+            if empty:
+                del self._remaining[parent]
+        if empty:
+            self._tasks.put(('rmd', parent))
+
+    def _record_error(self, path, error):
+        with self._lock:
+            self.errors.append((path, error))
+        if self.progress:
+            self.progress(self.files_deleted, self.dirs_deleted, len(self.errors))
+
+
+# ==================== FOLDER WATCH ====================
+
+class _InotifyBackend:
+    """Change source using Linux inotify through ctypes"""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_ISDIR = 0x40000000
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, root, initial_sync=False):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or not libc_name:
+            raise OSError("inotify is not available")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self._dirs = {}
+        self._pending = set()
+        self._last_read = time.time()
+        self._add_tree(root, report=initial_sync)
+
+    def _add_tree(self, top, report=True, newer_than=None):
+        """Watch a directory tree, optionally reporting the files already in it.
+
+        With ``newer_than`` only files modified since that time are reported.
+        """
+        for dirpath, dirnames, filenames in os.walk(top):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), self.MASK)
+            if wd >= 0:
+                self._dirs[wd] = dirpath
+            if not report:
+                continue
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    if newer_than is None or os.stat(path).st_mtime >= newer_than:
+                        self._pending.add(path)
+                except OSError:
+                    pass
+
+    def changes(self, timeout):
+        """Return paths that changed within timeout seconds"""
+        if not self._pending:
+            select.select([self._fd], [], [], timeout)
+        # Anything lost to a queue overflow was written after the last read
+        since, self._last_read = self._last_read, time.time()
+        overflowed = False
+        changed, self._pending = self._pending, set()
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & self.IN_Q_OVERFLOW:
+                    overflowed = True
+                    continue
+                if mask & self.IN_IGNORED:
+                    # The folder is gone or was moved off the watch
+                    self._dirs.pop(wd, None)
+                    continue
+                if wd not in self._dirs or not name:
+                    continue
+                path = os.path.join(self._dirs[wd], name)
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                        self._add_tree(path)
+                else:
+                    changed.add(path)
+        if overflowed:
+            # Allow for coarse file system timestamps
+            self._add_tree(self.root, newer_than=since - 2)
+        changed |= self._pending
+        self._pending = set()
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingBackend:
+    """Change source that compares scandir snapshots.
+
+    The wait between scans grows with the time a scan takes, so a large
+    tree is rescanned less often and polling stays a small part of the
+    CPU and disk time.
+    """
+
+    # Target share of wall time spent scanning, and the longest wait
+    SCAN_SHARE = 0.05
+    MAX_INTERVAL = 30.0
+
+    def __init__(self, root, initial_sync=False, wake=None):
+        self.root = root
+        self._wake = wake or threading.Event()
+        self._snapshot = {}
+        self._scan_time = 0.0
+        if not initial_sync:
+            self._scan(root, self._snapshot)
+        self._first = True
+
+    def _scan(self, top, snapshot):
+        """Collect (size, mtime) for every file below top"""
+        try:
+            with os.scandir(top) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            self._scan(entry.path, snapshot)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            snapshot[entry.path] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+
+    def changes(self, timeout):
+        """Return paths that changed since the previous scan"""
+        if not self._first:
+            interval = min(max(timeout, self._scan_time / self.SCAN_SHARE), self.MAX_INTERVAL)
+            if self._wake.wait(interval):
+                return set()
+        self._first = False
+        snapshot = {}
+        started = time.monotonic()
+        self._scan(self.root, snapshot)
+        self._scan_time = time.monotonic() - started
+        old, self._snapshot = self._snapshot, snapshot
+        return {path for path, stat in snapshot.items() if old.get(path) != stat}
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """Upload files from a local folder as they are written.
+
+    Changes are coalesced per path and a file is uploaded only once its
+    size and mtime have stayed the same for ``stable_seconds``. Ready
+    files are uploaded in parallel batches through a SessionPool.
+    """
+
+    def __init__(self, local_root, remote_root, pool, stable_seconds=2.0,
+                 workers=4, initial_sync=False, on_upload=None, on_error=None):
+        self.local_root = os.path.abspath(local_root)
+        self.remote_root = remote_root.rstrip('/') or '/'
+        self.pool = pool
+        self.stable_seconds = stable_seconds
+        self.on_upload = on_upload
+        self.on_error = on_error
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._stop = threading.Event()
+        self._pending = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._remote_dirs = set()
+        try:
+            self._backend = _InotifyBackend(self.local_root, initial_sync)
+        except (OSError, AttributeError):
+            self._backend = _PollingBackend(self.local_root, initial_sync, wake=self._stop)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def backend_name(self):
+        return 'inotify' if isinstance(self._backend, _InotifyBackend) else 'polling'
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching without waiting; uploads already running are allowed to finish"""
+        self._stop.set()
+
+    def _run(self):
+        """Collect changes and dispatch files once they are stable"""
+        try:
+            self._watch()
+        finally:
+            self._executor.shutdown(wait=False)
+            self._backend.close()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            for path in self._backend.changes(0.5):
+                self._pending.setdefault(path, (None, 0))
+            
+            now = time.monotonic()
+            ready = []
+            for path, (stat, since) in list(self._pending.items()):
+                try:
+                    st = os.stat(path)
+                    current = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    del self._pending[path]
+                    continue
+                if current != stat:
+                    self._pending[path] = (current, now)
+                elif now - since >= self.stable_seconds:
+                    with self._lock:
+                        if path in self._in_flight:
+                            continue
+                        self._in_flight.add(path)
+                    del self._pending[path]
+                    ready.append(path)
+            
+            for path in ready:
+                self._executor.submit(self._upload, path)
+
+    def _remote_path(self, path):
+        """Map a local file to its remote path"""
+        relative = os.path.relpath(path, self.local_root).replace(os.sep, '/')
+        return _join_remote(self.remote_root, relative)
+
+    def _ensure_remote_dir(self, ftp, remote_dir):
+        """Create missing remote parent folders"""
+        parts = [p for p in remote_dir.split('/') if p]
+        current = ''
+        for part in parts:
+            current += '/' + part
+            with self._lock:
+                if current in self._remote_dirs:
+                    continue
+            try:
+                ftp.mkd(current)
+            except ftplib.error_perm:
+                pass
+            with self._lock:
+                self._remote_dirs.add(current)
+
+    def _upload(self, path):
+        """Upload one stable file"""
+        remote = self._remote_path(path)
+        try:
+            with self.pool.session() as ftp:
+                self._ensure_remote_dir(ftp, remote.rsplit('/', 1)[0])
+                with open(path, 'rb') as f:
+                    stor_file(ftp, f'STOR {remote}', f)
+            if self.on_upload:
+                self.on_upload(path, remote)
+        except Exception as e:
+            if self.on_error:
+                self.on_error(path, e)
+        finally:
+            with self._lock:
+                self._in_flight.discard(path)
+
+
+# ==================== LIST VIEWS ====================
+
+def format_size(size):
+    """Format a byte count for display"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} PB"
+
+
+class DirectoryModel:
+    """Compact, columnar listing of one directory.
+
+    Names are packed into a single NUL-separated string with an offset
+    array, and sizes, modification times and flags live in typed arrays,
+    so an entry costs a few dozen bytes instead of a tuple of strings.
+    Display strings are built only when a row is shown, and views refer
+    to entries by their index.
+
+    ``entries`` yields (name, is_dir, size, mtime) tuples, optionally
+    followed by flags and a date text to show instead of ``mtime``.
+    Each entry's place in case-insensitive name order is worked out once,
+    when the rows are added, so sorting by name compares integers.
+    """
+
+    DIR = 1
+    DENIED = 2
+
+    __slots__ = ('offsets', 'sizes', 'mtimes', 'flags', 'dates', 'name_ranks',
+                 '_names', '_folded')
+
+    def __init__(self, entries=()):
+        self.offsets = array('Q', [0])
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.flags = bytearray()
+        self.dates = {}
+        self._folded = None
+        names = []
+        for name, is_dir, size, mtime, *extra in entries:
+            flags = extra[0] if extra else 0
+            if len(extra) > 1 and extra[1]:
+                self.dates[len(names)] = extra[1]
+            names.append(name)
+            self.offsets.append(self.offsets[-1] + len(name) + 1)
+            self.sizes.append(0 if is_dir else size)
+            self.mtimes.append(mtime)
+            self.flags.append(flags | (self.DIR if is_dir else 0))
+        self._names = '\0'.join(names) + '\0' if names else ''
+        self.name_ranks = array('I', bytes(4 * len(names)))
+        folded = [name.casefold() for name in names]
+        for rank, index in enumerate(sorted(range(len(names)), key=folded.__getitem__)):
+            self.name_ranks[index] = rank
+
+    @classmethod
+    def from_listing(cls, listing):
+        """Build from list_remote_dir() tuples"""
+        entries = []
+        for name, is_dir, size, modify in listing:
+            mtime = _timestamp(modify)
+            entries.append((name, is_dir, size, mtime, 0, None if mtime else modify))
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.flags)
+
+    def name(self, index):
+        return self._names[self.offsets[index]:self.offsets[index + 1] - 1]
+
+    def is_dir(self, index):
+        return bool(self.flags[index] & self.DIR)
+
+    def values(self, index):
+        """Tree values for an entry: icon and name, size, modified"""
+        name = self.name(index)
+        flags = self.flags[index]
+        if flags & self.DENIED:
+            return ("🔒 " + name, "", self.dates.get(index, ""))
+        date = self.dates.get(index)
+        if date is None:
+            mtime = self.mtimes[index]
+            date = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M') if mtime else ""
+        if flags & self.DIR:
+            return ("📁 " + name, "", date)
+        return ("📄 " + name, format_size(self.sizes[index]), date)
+
+    def matching(self, text):
+        """Indices of entries whose name contains text, ignoring case"""
+        if self._folded is None:
+            folded = self._names.lower()
+            # Lowercasing a few characters changes their length
+            self._folded = folded if len(folded) == len(self._names) else False
+        text = text.lower()
+        if self._folded is False:
+            return {i for i in range(len(self)) if text in self.name(i).lower()}
+        
+        found = set()
+        offsets = self.offsets
+        pos = self._folded.find(text)
+        while pos != -1:
+            index = bisect.bisect_right(offsets, pos) - 1
+            found.add(index)
+            pos = self._folded.find(text, offsets[index + 1])
+        return found
+
+
+class ListingView:
+    """Column sorting and incremental filtering for a file Treeview.
+
+    Every entry of a DirectoryModel is inserted once with its index as
+    the item id; sorting and filtering only compute a new order of ids and
+    hand it to the tree in a single set_children() call. A filter that
+    extends the previous one only searches the rows that are visible.
+    """
+
+    HEADINGS = {'name': 'Name', 'size': 'Size', 'modified': 'Modified'}
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.model = DirectoryModel()
+        self.sort_column = 'name'
+        self.reverse = False
+        self.filter_text = ''
+        self._order = []
+        self._visible = []
+        for column in self.HEADINGS:
+            tree.heading(column, command=lambda c=column: self.sort(c))
+
+    def clear(self):
+        """Remove every row, including ones hidden by the filter"""
+        if len(self.model):
+            self.tree.delete(*[str(i) for i in range(len(self.model))])
+        self.model = DirectoryModel()
+        self._order = []
+        self._visible = []
+
+    def load(self, model):
+        """Show the entries of a DirectoryModel"""
+        self.clear()
+        self.model = model
+        for i in range(len(model)):
+            self.tree.insert('', 'end', iid=str(i), values=model.values(i),
+                             tags=('folder' if model.is_dir(i) else 'file',))
+        self._resort()
+        self._visible = self._order
+        self._apply_filter(self.filter_text, incremental=False)
+
+    # Entries behind tree items
+    
+    def name(self, item):
+        return self.model.name(int(item))
+
+    def is_dir(self, item):
+        return self.model.is_dir(int(item))
+
+    def selected(self):
+        """(name, is_dir) of each selected row"""
+        return [(self.name(item), self.is_dir(item)) for item in self.tree.selection()]
+
+    def find(self, name):
+        """Tree item showing an entry name, or None"""
+        for item in self._visible:
+            if self.model.name(item) == name:
+                return str(item)
+        return None
+
+    # Sorting and filtering
+    
+    def sort(self, column):
+        """Sort by a column; clicking the same column again reverses it"""
+        if column == self.sort_column:
+            self.reverse = not self.reverse
+        else:
+            self.sort_column = column
+            self.reverse = False
+        self._resort()
+        visible = set(self._visible)
+        self._visible = [i for i in self._order if i in visible]
+        self._show()
+
+    def set_filter(self, text):
+        """Filter rows by name, narrowing the last result when possible"""
+        text = text.lower()
+        incremental = text.startswith(self.filter_text)
+        self._apply_filter(text, incremental)
+
+    def _resort(self):
+        """Order rows by the sort column, folders always first"""
+        model = self.model
+        if self.sort_column == 'size':
+            key = model.sizes.__getitem__
+        elif self.sort_column == 'modified':
+            key = model.mtimes.__getitem__
+        else:
+            key = model.name_ranks.__getitem__
+        flags = model.flags
+        folders = [i for i in range(len(model)) if flags[i] & DirectoryModel.DIR]
+        files = [i for i in range(len(model)) if not flags[i] & DirectoryModel.DIR]
+        folders.sort(key=key, reverse=self.reverse)
+        files.sort(key=key, reverse=self.reverse)
+        self._order = folders + files
+        for column, text in self.HEADINGS.items():
+            arrow = (" ▼" if self.reverse else " ▲") if column == self.sort_column else ""
+            self.tree.heading(column, text=text + arrow)
+
+    def _apply_filter(self, text, incremental):
+        candidates = self._visible if incremental else self._order
+        if text:
+            matches = self.model.matching(text)
+            self._visible = [i for i in candidates if i in matches]
+        else:
+            self._visible = self._order
+        self.filter_text = text
+        self._show()
+
+    def _show(self):
+        self.tree.set_children('', *[str(i) for i in self._visible])
+
+
+def _timestamp(modify):
+    """Seconds since the epoch for an MLSD modify fact, 0 if unknown"""
+    if len(modify) >= 14 and modify[:14].isdigit():
+        try:
+            return datetime.strptime(modify[:14], '%Y%m%d%H%M%S').timestamp()
+        except ValueError:
+            pass
+    return 0
+
+
+class RemoteSession:
+    """Connection and browsing state of one remote tab"""
+
+    def __init__(self):
+        self.ftp = None
+        self.connected = False
+        self.current_remote_path = "/"
+        self.session_settings = None
+        self.pool = None
+        self.title = "New Session"
+        self.frame = None
+        self.remote_tree = None
+        self.remote_view = None
+        self.remote_path_var = None
+        self.listing_cache = ListingCache(HyperFTP.PREFETCH_ENTRIES, HyperFTP.PREFETCH_TTL)
+        self.prefetcher = None
+        self.hover_path = None
+
+
+def _session_attr(name):
+    """Property that forwards to the active RemoteSession"""
+    return property(lambda self: getattr(self.session, name),
+                    lambda self, value: setattr(self.session, name, value))
 
 
 class HyperFTP:
@@ -27,21 +3072,106 @@ class HyperFTP:
     VERSION = "1.0.0"
     APP_NAME = "HyperFTP"
     CONFIG_FILE = "hyperftp_config.json"
+    INDEX_DIR = "hyperftp_index"
+    QUEUE_FILE = "hyperftp_queue.sqlite"
+    # Older versions kept the queue, passwords included, in JSON
+    LEGACY_QUEUE_FILE = "hyperftp_queue.json"
+    QUEUE_WORKERS = 2
+    # Large uploads are split over this many connections where the server allows
+    UPLOAD_SEGMENTS = 4
+    # Default compression of folders uploaded as one streamed archive
+    BUNDLE_SUFFIX = ".tar.gz"
+    DIGEST_DB = "hyperftp_digests.sqlite"
+    
+    # Background sessions shared by watchers and other workers
+    POOL_SIZE = 4
+    # Cap on background sessions across all tabs and the queue
+    TRANSFER_LIMIT = 8
+    
+    # Quick look at part of a remote file
+    PREVIEW_KB = 16
+    
+    # Speculative listing of nearby folders
+    PREFETCH_WORKERS = 2
+    PREFETCH_ENTRIES = 200
+    PREFETCH_TTL = 60
+    
+    # Logged-in sessions kept for switching back to recent servers
+    WARM_SESSIONS = 4
+    WARM_MAX_IDLE = 120
+    
+    # A folder's listing is refreshed at most this often (ms) as transfers finish
+    REFRESH_DELAY = 500
+    
+    # The active tab's state
+    ftp = _session_attr('ftp')
+    connected = _session_attr('connected')
+    current_remote_path = _session_attr('current_remote_path')
+    session_settings = _session_attr('session_settings')
+    pool = _session_attr('pool')
+    remote_tree = _session_attr('remote_tree')
+    remote_view = _session_attr('remote_view')
+    remote_path_var = _session_attr('remote_path_var')
     
-    def __init__(self, root):
+    # Download write-behind settings
+    WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+    WRITE_BUFFERS = 2
+    FSYNC_POLICY = "close"
+    
+    def __init__(self, root, profiler=None):
         self.root = root
+        self.profiler = profiler or StartupProfiler()
         self.root.title(f"{self.APP_NAME} v{self.VERSION}")
         self.root.geometry("1000x700")
         self.root.minsize(800, 600)
         
-        # FTP Connection
-        self.ftp = None
-        self.connected = False
-        self.current_remote_path = "/"
+        # FTP sessions, one per remote tab
+        self.session = RemoteSession()
+        self.sessions = [self.session]
+        self.transfer_limiter = threading.BoundedSemaphore(self.TRANSFER_LIMIT)
+        self._drag_source = None
+        self.prefetch_var = tk.BooleanVar(value=False)
+        self.prewarm_var = tk.BooleanVar(value=False)
+        self.warm_sessions = WarmSessions(self.WARM_SESSIONS, self.WARM_MAX_IDLE)
+        self.root.after(self.WARM_MAX_IDLE * 500, self._prune_warm_sessions)
+        self.diagnostics = Diagnostics(self.root, on_stall=self._on_stall)
+        self.stall_var = tk.BooleanVar(value=False)
+        self.cpu_profile_var = tk.BooleanVar(value=False)
+        self.memory_trace_var = tk.BooleanVar(value=False)
+        self.skip_identical_var = tk.BooleanVar(value=False)
+        self.bundle_suffix_var = tk.StringVar(value=self.BUNDLE_SUFFIX)
+        self._digest_cache = None
+        self.watchers = []
         self.current_local_path = str(Path.home())
+        self._local_menu = None
+        self._remote_menu = None
+        self._queue_window = None
+        self._replicate_window = None
+        self._replicator = None
+        self._replicating = False
+        self._preview_window = None
+        self._preview_target = None
+        self._preview_file = None
+        self._preview_lock = threading.Lock()
+        self._pending_refreshes = {}
         
-        # Saved connections
-        self.saved_connections = self.load_connections()
+        # Transfers run from a persistent queue
+        self.transfer_queue = TransferQueue(
+            self.QUEUE_FILE, self.QUEUE_WORKERS,
+            writer_options={'buffer_size': self.WRITE_BUFFER_SIZE,
+                            'buffers': self.WRITE_BUFFERS,
+                            'fsync': self.FSYNC_POLICY},
+            limiter=self.transfer_limiter,
+            on_change=self._queue_job_changed,
+            on_progress=lambda job, progress: self.root.after(0, lambda: self.progress_var.set(progress)),
+            upload_segments=self.UPLOAD_SEGMENTS,
+            credentials=self._queue_credentials,
+            legacy_path=self.LEGACY_QUEUE_FILE)
+        self.transfer_queue.start()
+        
+        # Saved connections are read in the background
+        self.saved_connections = {}
+        self._connections_loaded = threading.Event()
         
         # Setup UI
         self.setup_styles()
@@ -49,13 +3179,50 @@ class HyperFTP:
         self.create_toolbar()
         self.create_main_layout()
         self.create_status_bar()
+        self.profiler.mark("widgets created")
         
         # Bind events
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
         self.log_message("Welcome to HyperFTP!", "info")
         self.log_message("Enter connection details and click 'Connect' to start.", "info")
-        self.refresh_local_files()
+        
+        # Defer disk work until the window is up
+        threading.Thread(target=self._startup_thread, daemon=True).start()
+        self.root.after_idle(lambda: self.profiler.mark("first paint"))
+
+    def _startup_thread(self):
+        """Load config and scan the home folder off the UI thread"""
+        connections = self.load_connections()
+        self._connections_loaded.set()
+        self.root.after(0, lambda: self._on_connections_loaded(connections))
+        
+        restored = self.transfer_queue.load()
+        if restored:
+            self.root.after(0, lambda: self.log_message(
+                f"Resuming {restored} queued transfers", "info"))
+        
+        path = self.current_local_path
+        try:
+            items = self._scan_local_dir(path)
+        except OSError as e:
+            error = str(e)
+            self.root.after(0, lambda: self.log_message(f"Error reading local directory: {error}", "error"))
+            items = []
+        self.root.after(0, lambda: self._on_startup_scan(path, items))
+
+    def _on_connections_loaded(self, connections):
+        """Merge connections loaded at startup into the form"""
+        self.saved_connections = {**connections, **self.saved_connections}
+        self.saved_combo['values'] = list(self.saved_connections.keys())
+        self.profiler.mark("connections loaded")
+
+    def _on_startup_scan(self, path, items):
+        """Show the initial local listing unless the user already moved on"""
+        if path == self.current_local_path and not self.local_tree.get_children():
+            self._show_local_items(items)
+        self.profiler.mark("local files listed")
+        self.profiler.finish(self)
 
     def setup_styles(self):
         """Configure modern ttk styles"""
@@ -105,40 +3272,97 @@ class HyperFTP:
         menubar = tk.Menu(self.root)
         self.root.config(menu=menubar)
         
-        # File menu
-        file_menu = tk.Menu(menubar, tearoff=0)
-        menubar.add_cascade(label="File", menu=file_menu)
+        # Menu contents are built the first time each menu is opened
+        self._add_lazy_menu(menubar, "File", self._build_file_menu)
+        self._add_lazy_menu(menubar, "Transfer", self._build_transfer_menu)
+        self._add_lazy_menu(menubar, "View", self._build_view_menu)
+        self._add_lazy_menu(menubar, "Tools", self._build_tools_menu)
+        self._add_lazy_menu(menubar, "Help", self._build_help_menu)
+        
+        # Keyboard shortcuts
+        self.root.bind('<Control-n>', lambda e: self.new_connection())
+        self.root.bind('<Control-u>', lambda e: self.upload_file())
+        self.root.bind('<Control-d>', lambda e: self.download_file())
+        self.root.bind('<F5>', lambda e: self.refresh_local_files())
+        self.root.bind('<F6>', lambda e: self.refresh_remote_files())
+        self.root.bind('<Control-f>', lambda e: self.show_index_search())
+        self.root.bind('<Control-t>', lambda e: self.new_session_tab())
+        self.root.bind('<Control-w>', lambda e: self.close_session_tab())
+
+    def _add_lazy_menu(self, menubar, label, build):
+        """Add a cascade whose items are created on first use"""
+        menu = tk.Menu(menubar, tearoff=0)
+        
+        def populate():
+            if menu.index(tk.END) is None:
+                build(menu)
+        
+        menu.config(postcommand=populate)
+        menubar.add_cascade(label=label, menu=menu)
+
+    def _build_file_menu(self, file_menu):
+        """Fill the File menu"""
         file_menu.add_command(label="New Connection", command=self.new_connection, accelerator="Ctrl+N")
         file_menu.add_command(label="Save Connection", command=self.save_current_connection)
+        file_menu.add_checkbutton(label="Pre-connect Saved Connections", variable=self.prewarm_var,
+                                  command=self._on_prewarm_toggled)
+        file_menu.add_separator()
+        file_menu.add_command(label="New Tab", command=self.new_session_tab, accelerator="Ctrl+T")
+        file_menu.add_command(label="Close Tab", command=self.close_session_tab, accelerator="Ctrl+W")
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.on_closing, accelerator="Alt+F4")
-        
-        # Transfer menu
-        transfer_menu = tk.Menu(menubar, tearoff=0)
-        menubar.add_cascade(label="Transfer", menu=transfer_menu)
+
+    def _build_transfer_menu(self, transfer_menu):
+        """Fill the Transfer menu"""
         transfer_menu.add_command(label="Upload", command=self.upload_file, accelerator="Ctrl+U")
         transfer_menu.add_command(label="Download", command=self.download_file, accelerator="Ctrl+D")
         transfer_menu.add_separator()
         transfer_menu.add_command(label="Upload Folder", command=self.upload_folder)
-        
-        # View menu
-        view_menu = tk.Menu(menubar, tearoff=0)
-        menubar.add_cascade(label="View", menu=view_menu)
+        transfer_menu.add_command(label="Upload Folder as Bundle", command=self.upload_bundle)
+        compression_menu = tk.Menu(transfer_menu, tearoff=0)
+        for label, suffix in BUNDLE_FORMATS:
+            compression_menu.add_radiobutton(label=f"{label} ({suffix})", value=suffix,
+                                             variable=self.bundle_suffix_var)
+        transfer_menu.add_cascade(label="Bundle Compression", menu=compression_menu)
+        transfer_menu.add_command(label="Download and Extract", command=self.download_bundle)
+        transfer_menu.add_checkbutton(label="Skip Identical Files", variable=self.skip_identical_var)
+
+    def _build_view_menu(self, view_menu):
+        """Fill the View menu"""
         view_menu.add_command(label="Refresh Local", command=self.refresh_local_files, accelerator="F5")
         view_menu.add_command(label="Refresh Remote", command=self.refresh_remote_files, accelerator="F6")
-        
-        # Help menu
-        help_menu = tk.Menu(menubar, tearoff=0)
-        menubar.add_cascade(label="Help", menu=help_menu)
+        view_menu.add_checkbutton(label="Prefetch Folders", variable=self.prefetch_var,
+                                  command=self._on_prefetch_toggled)
+        view_menu.add_separator()
+        view_menu.add_command(label="Transfer Queue", command=self.show_transfer_queue)
+        view_menu.add_command(label="Preview Remote File", command=self.show_preview)
+
+    def _build_tools_menu(self, tools_menu):
+        """Fill the Tools menu"""
+        tools_menu.add_command(label="Search Remote Index...", command=self.show_index_search,
+                               accelerator="Ctrl+F")
+        tools_menu.add_command(label="Update Remote Index", command=self.update_remote_index)
+        tools_menu.add_command(label="Rebuild Remote Index", 
+                               command=lambda: self.update_remote_index(full=True))
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Watch Folder...", command=self.show_watch_folder)
+        tools_menu.add_command(label="Stop Folder Watches", command=lambda: self.stop_watchers())
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Site-to-Site Transfer...", command=self.show_site_to_site)
+        tools_menu.add_command(label="Replicate to Servers...", command=self.show_replicate)
+
+    def _build_help_menu(self, help_menu):
+        """Fill the Help menu"""
         help_menu.add_command(label="About", command=self.show_about)
         help_menu.add_command(label="Documentation", command=self.show_docs)
-        
-        # Keyboard shortcuts
-        self.root.bind('<Control-n>', lambda e: self.new_connection())
-        self.root.bind('<Control-u>', lambda e: self.upload_file())
-        self.root.bind('<Control-d>', lambda e: self.download_file())
-        self.root.bind('<F5>', lambda e: self.refresh_local_files())
-        self.root.bind('<F6>', lambda e: self.refresh_remote_files())
+        help_menu.add_separator()
+        help_menu.add_checkbutton(label="Detect UI Stalls", variable=self.stall_var,
+                                  command=self.toggle_stall_detector)
+        help_menu.add_checkbutton(label="CPU Profile", variable=self.cpu_profile_var,
+                                  command=self.toggle_cpu_profile)
+        help_menu.add_checkbutton(label="Memory Trace", variable=self.memory_trace_var,
+                                  command=self.toggle_memory_trace)
+        help_menu.add_command(label="Write Diagnostics Report", command=self.write_diagnostics_report)
 
     def create_toolbar(self):
         """Create main toolbar"""
@@ -247,6 +3471,13 @@ class HyperFTP:
         ttk.Button(local_path_frame, text="🔄", width=3,
                   command=self.refresh_local_files).pack(side=tk.LEFT)
         
+        local_filter_frame = ttk.Frame(left_frame)
+        local_filter_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(local_filter_frame, text="Filter:").pack(side=tk.LEFT)
+        self.local_filter_var = tk.StringVar()
+        ttk.Entry(local_filter_frame, textvariable=self.local_filter_var).pack(
+            side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
         # Local file list
         local_tree_frame = ttk.Frame(left_frame)
         local_tree_frame.pack(fill=tk.BOTH, expand=True)
@@ -274,6 +3505,10 @@ class HyperFTP:
         self.local_tree.bind('<Double-1>', self.local_double_click)
         self.local_tree.bind('<Button-3>', self.local_context_menu)
         
+        self.local_view = ListingView(self.local_tree)
+        self.local_filter_var.trace_add(
+            'write', lambda *args: self.local_view.set_filter(self.local_filter_var.get()))
+        
         # Local buttons
         local_btn_frame = ttk.Frame(left_frame)
         local_btn_frame.pack(fill=tk.X, pady=(5, 0))
@@ -289,47 +3524,11 @@ class HyperFTP:
         right_frame = ttk.LabelFrame(main_paned, text="🌐 Remote Files", padding="5")
         main_paned.add(right_frame, weight=1)
         
-        # Remote path bar
-        remote_path_frame = ttk.Frame(right_frame)
-        remote_path_frame.pack(fill=tk.X, pady=(0, 5))
-        
-        ttk.Label(remote_path_frame, text="Path:").pack(side=tk.LEFT)
-        self.remote_path_var = tk.StringVar(value="/")
-        self.remote_path_entry = ttk.Entry(remote_path_frame, textvariable=self.remote_path_var)
-        self.remote_path_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        self.remote_path_entry.bind('<Return>', lambda e: self.navigate_remote_path())
-        
-        ttk.Button(remote_path_frame, text="⬆️", width=3,
-                  command=self.remote_go_up).pack(side=tk.LEFT, padx=2)
-        ttk.Button(remote_path_frame, text="🔄", width=3,
-                  command=self.refresh_remote_files).pack(side=tk.LEFT)
-        
-        # Remote file list
-        remote_tree_frame = ttk.Frame(right_frame)
-        remote_tree_frame.pack(fill=tk.BOTH, expand=True)
-        
-        self.remote_tree = ttk.Treeview(remote_tree_frame,
-                                        columns=('name', 'size', 'modified'),
-                                        show='headings', selectmode='extended')
-        self.remote_tree.heading('name', text='Name', anchor=tk.W)
-        self.remote_tree.heading('size', text='Size', anchor=tk.E)
-        self.remote_tree.heading('modified', text='Modified', anchor=tk.W)
-        self.remote_tree.column('name', width=200)
-        self.remote_tree.column('size', width=80)
-        self.remote_tree.column('modified', width=120)
-        
-        remote_scroll_y = ttk.Scrollbar(remote_tree_frame, orient=tk.VERTICAL,
-                                        command=self.remote_tree.yview)
-        remote_scroll_x = ttk.Scrollbar(remote_tree_frame, orient=tk.HORIZONTAL,
-                                        command=self.remote_tree.xview)
-        self.remote_tree.configure(yscrollcommand=remote_scroll_y.set,
-                                  xscrollcommand=remote_scroll_x.set)
-        
-        self.remote_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        remote_scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        self.remote_tree.bind('<Double-1>', self.remote_double_click)
-        self.remote_tree.bind('<Button-3>', self.remote_context_menu)
+        # One tab per server session
+        self.remote_notebook = ttk.Notebook(right_frame)
+        self.remote_notebook.pack(fill=tk.BOTH, expand=True)
+        self.remote_notebook.bind('<<NotebookTabChanged>>', self._on_tab_changed)
+        self._build_session_tab(self.session)
         
         # Remote buttons
         remote_btn_frame = ttk.Frame(right_frame)
@@ -343,6 +3542,8 @@ class HyperFTP:
                   command=self.delete_remote_file).pack(side=tk.LEFT, padx=2)
         ttk.Button(remote_btn_frame, text="✏️ Rename",
                   command=self.rename_remote_file).pack(side=tk.LEFT, padx=2)
+        ttk.Button(remote_btn_frame, text="➕ Tab",
+                  command=self.new_session_tab).pack(side=tk.RIGHT, padx=2)
         
         # Log panel at bottom
         log_frame = ttk.LabelFrame(self.root, text="📋 Transfer Log", padding="5")
@@ -359,6 +3560,69 @@ class HyperFTP:
         self.log_text.tag_configure('error', foreground='#f44336')
         self.log_text.tag_configure('warning', foreground='#FF9800')
 
+    def _build_session_tab(self, session):
+        """Create the path bar and file list for a remote tab"""
+        tab = ttk.Frame(self.remote_notebook, padding="5")
+        session.frame = tab
+        self.remote_notebook.add(tab, text=session.title)
+        
+        # Remote path bar
+        remote_path_frame = ttk.Frame(tab)
+        remote_path_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(remote_path_frame, text="Path:").pack(side=tk.LEFT)
+        session.remote_path_var = tk.StringVar(value="/")
+        remote_path_entry = ttk.Entry(remote_path_frame, textvariable=session.remote_path_var)
+        remote_path_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        remote_path_entry.bind('<Return>', lambda e: self.navigate_remote_path())
+        
+        ttk.Button(remote_path_frame, text="⬆️", width=3,
+                  command=self.remote_go_up).pack(side=tk.LEFT, padx=2)
+        ttk.Button(remote_path_frame, text="🔄", width=3,
+                  command=self.refresh_remote_files).pack(side=tk.LEFT)
+        
+        remote_filter_frame = ttk.Frame(tab)
+        remote_filter_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(remote_filter_frame, text="Filter:").pack(side=tk.LEFT)
+        filter_var = tk.StringVar()
+        ttk.Entry(remote_filter_frame, textvariable=filter_var).pack(
+            side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        # Remote file list
+        remote_tree_frame = ttk.Frame(tab)
+        remote_tree_frame.pack(fill=tk.BOTH, expand=True)
+        
+        tree = ttk.Treeview(remote_tree_frame,
+                            columns=('name', 'size', 'modified'),
+                            show='headings', selectmode='extended')
+        tree.heading('name', text='Name', anchor=tk.W)
+        tree.heading('size', text='Size', anchor=tk.E)
+        tree.heading('modified', text='Modified', anchor=tk.W)
+        tree.column('name', width=200)
+        tree.column('size', width=80)
+        tree.column('modified', width=120)
+        session.remote_tree = tree
+        
+        remote_scroll_y = ttk.Scrollbar(remote_tree_frame, orient=tk.VERTICAL,
+                                        command=tree.yview)
+        remote_scroll_x = ttk.Scrollbar(remote_tree_frame, orient=tk.HORIZONTAL,
+                                        command=tree.xview)
+        tree.configure(yscrollcommand=remote_scroll_y.set,
+                       xscrollcommand=remote_scroll_x.set)
+        
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        remote_scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        tree.bind('<Double-1>', self.remote_double_click)
+        tree.bind('<Button-3>', self.remote_context_menu)
+        
+        session.remote_view = ListingView(tree)
+        filter_var.trace_add('write', lambda *args: session.remote_view.set_filter(filter_var.get()))
+        tree.bind('<ButtonPress-1>', lambda e: self._start_remote_drag(session))
+        tree.bind('<ButtonRelease-1>', self._end_remote_drag)
+        tree.bind('<<TreeviewSelect>>', lambda e: self._prefetch_selection(session))
+        tree.bind('<Motion>', lambda e: self._prefetch_hover(session, e))
+
     def create_status_bar(self):
         """Create status bar"""
         status_frame = ttk.Frame(self.root)
@@ -378,187 +3642,298 @@ class HyperFTP:
     
     def connect_ftp(self):
         """Connect to FTP server"""
-        host = self.host_var.get().strip()
-        port = int(self.port_var.get() or 21)
-        username = self.user_var.get().strip()
-        password = self.pass_var.get()
+        settings = self._connection_settings()
+        host = settings['host']
+        port = settings['port']
         
         if not host:
             messagebox.showerror("Error", "Please enter a host address")
             return
         
-        if self.anonymous_var.get():
-            username = "anonymous"
-            password = "anonymous@"
-        elif not username:
+        if not settings['username']:
             messagebox.showerror("Error", "Please enter username or check Anonymous")
             return
         
         self.log_message(f"Connecting to {host}:{port}...", "info")
         self.status_var.set(f"Connecting to {host}...")
+        session = self.session
+        session.session_settings = settings
         
         # Connect in thread to avoid GUI freeze
-        thread = threading.Thread(target=self._connect_thread, 
-                                 args=(host, port, username, password))
+        thread = threading.Thread(target=self._connect_thread, args=(session, settings))
         thread.daemon = True
         thread.start()
 
-    def _connect_thread(self, host, port, username, password):
+    def _connection_settings(self):
+        """Collect the connection form into a settings dict"""
+        username = self.user_var.get().strip()
+        password = self.pass_var.get()
+        if self.anonymous_var.get():
+            username = "anonymous"
+            password = "anonymous@"
+        return {
+            'host': self.host_var.get().strip(),
+            'port': int(self.port_var.get() or 21),
+            'username': username,
+            'password': password,
+            'tls': self.tls_var.get(),
+            'passive': self.passive_var.get()
+        }
+
+    def _connect_thread(self, session, settings):
         """Thread for FTP connection"""
         try:
-            if self.tls_var.get():
-                self.ftp = ftplib.FTP_TLS()
+            warm = self.warm_sessions.take(settings) if self.prewarm_var.get() else None
+            if warm is not None:
+                session.ftp, session.current_remote_path = warm
             else:
-                self.ftp = ftplib.FTP()
+                session.ftp = open_session(settings)
+                session.current_remote_path = session.ftp.pwd()
+            session.connected = True
             
-            self.ftp.connect(host, port, timeout=30)
-            self.ftp.login(username, password)
-            
-            if self.tls_var.get():
-                self.ftp.prot_p()  # Switch to secure data connection
-            
-            if self.passive_var.get():
-                self.ftp.set_pasv(True)
-            
-            self.connected = True
-            self.current_remote_path = self.ftp.pwd()
-            
-            self.root.after(0, self._on_connect_success)
+            self.root.after(0, lambda: self._on_connect_success(session))
             
         except Exception as e:
-            self.root.after(0, lambda: self._on_connect_error(str(e)))
+            error = str(e)
+            self.root.after(0, lambda: self._on_connect_error(session, error))
+
+    def _on_prewarm_toggled(self):
+        """Log out parked sessions once pre-connecting is turned off"""
+        if not self.prewarm_var.get():
+            self.warm_sessions.close()
 
-    def _on_connect_success(self):
+    def _prune_warm_sessions(self):
+        """Log out parked sessions that have been idle too long"""
+        self.warm_sessions.prune()
+        self.root.after(self.WARM_MAX_IDLE * 500, self._prune_warm_sessions)
+
+    def _on_connect_success(self, session):
         """Called when connection succeeds"""
-        self.log_message(f"Connected successfully! Welcome: {self.ftp.getwelcome()}", "success")
-        self.status_var.set(f"Connected to {self.host_var.get()}")
-        self.connect_btn.config(state=tk.DISABLED)
-        self.disconnect_btn.config(state=tk.NORMAL)
-        self.refresh_remote_files()
+        self.log_message(f"Connected successfully! Welcome: {session.ftp.getwelcome()}", "success")
+        session.pool = SessionPool(session.session_settings, self.POOL_SIZE, self.transfer_limiter)
+        session.prefetcher = Prefetcher(session.pool, session.listing_cache, self.PREFETCH_WORKERS)
+        session.title = session.session_settings['host']
+        self.remote_notebook.tab(session.frame, text=session.title)
+        self._update_connection_state()
+        self.refresh_remote_files(session)
 
-    def _on_connect_error(self, error):
+    def _on_connect_error(self, session, error):
         """Called when connection fails"""
         self.log_message(f"Connection failed: {error}", "error")
         self.status_var.set("Connection failed")
         messagebox.showerror("Connection Error", f"Failed to connect:\n{error}")
-        self.ftp = None
-        self.connected = False
+        session.ftp = None
+        session.connected = False
 
-    def disconnect_ftp(self):
+    def disconnect_ftp(self, session=None):
         """Disconnect from FTP server"""
-        if self.ftp:
-            try:
-                self.ftp.quit()
-            except:
-                pass
-            self.ftp = None
+        session = session or self.session
+        self.stop_watchers(session.pool)
+        if session.prefetcher:
+            session.prefetcher.stop()
+            session.prefetcher = None
+        session.listing_cache.invalidate()
+        if session.pool:
+            session.pool.close()
+            session.pool = None
         
-        self.connected = False
-        self.connect_btn.config(state=tk.NORMAL)
-        self.disconnect_btn.config(state=tk.DISABLED)
-        self.remote_tree.delete(*self.remote_tree.get_children())
-        self.remote_path_var.set("/")
-        self.status_var.set("Disconnected")
+        if session.ftp:
+            if self.prewarm_var.get():
+                # Parked rather than logged out so switching back is instant
+                self.warm_sessions.put(session.session_settings, session.ftp,
+                                       session.current_remote_path)
+            else:
+                try:
+                    session.ftp.quit()
+                except ftplib.all_errors:
+                    session.ftp.close()
+            session.ftp = None
+        
+        session.connected = False
+        session.title = "New Session"
+        self.remote_notebook.tab(session.frame, text=session.title)
+        session.remote_view.clear()
+        session.remote_path_var.set("/")
+        self._update_connection_state()
         self.log_message("Disconnected from server", "info")
 
+    def _update_connection_state(self):
+        """Sync buttons and status bar with the active tab"""
+        if self.connected:
+            self.connect_btn.config(state=tk.DISABLED)
+            self.disconnect_btn.config(state=tk.NORMAL)
+            self.status_var.set(f"Connected to {self.session_settings['host']}")
+        else:
+            self.connect_btn.config(state=tk.NORMAL)
+            self.disconnect_btn.config(state=tk.DISABLED)
+            self.status_var.set("Disconnected")
+
+    # ==================== SESSION TABS ====================
+    
+    def new_session_tab(self):
+        """Open an empty tab for another server"""
+        session = RemoteSession()
+        self.sessions.append(session)
+        self._build_session_tab(session)
+        self.remote_notebook.select(session.frame)
+
+    def close_session_tab(self):
+        """Disconnect and close the active tab"""
+        session = self.session
+        if session.connected:
+            self.disconnect_ftp(session)
+        if len(self.sessions) == 1:
+            return
+        self.sessions.remove(session)
+        self.remote_notebook.forget(session.frame)
+        session.frame.destroy()
+
+    def _on_tab_changed(self, event=None):
+        """Make the selected tab the active session"""
+        selected = self.remote_notebook.select()
+        for session in self.sessions:
+            if str(session.frame) == selected:
+                self.session = session
+                break
+        self._update_connection_state()
+
+    def _start_remote_drag(self, session):
+        """Remember which tab a drag started in"""
+        self._drag_source = session
+
+    def _end_remote_drag(self, event):
+        """Copy the selection when it is dropped on another tab's header"""
+        source, self._drag_source = self._drag_source, None
+        if source is None or not source.connected:
+            return
+        target_widget = self.root.winfo_containing(event.x_root, event.y_root)
+        if target_widget is not self.remote_notebook:
+            return
+        
+        x = event.x_root - self.remote_notebook.winfo_rootx()
+        y = event.y_root - self.remote_notebook.winfo_rooty()
+        try:
+            target = self.sessions[self.remote_notebook.index(f"@{x},{y}")]
+        except (tk.TclError, IndexError):
+            return
+        if target is source:
+            return
+        if not target.connected:
+            self.log_message("Connect the target tab before dropping files on it", "warning")
+            return
+        
+        paths = [_join_remote(source.current_remote_path, name)
+                 for name, is_dir in source.remote_view.selected() if not is_dir]
+        if paths:
+            self.site_to_site_copy(source.session_settings, target.session_settings,
+                                   paths, target.current_remote_path)
+
     # ==================== FILE OPERATIONS ====================
     
     def refresh_local_files(self):
         """Refresh local file list"""
-        self.local_tree.delete(*self.local_tree.get_children())
-        
         try:
-            path = self.current_local_path
-            self.local_path_var.set(path)
-            
-            # List directory contents
-            items = []
-            for item in os.listdir(path):
-                full_path = os.path.join(path, item)
-                try:
-                    stat = os.stat(full_path)
-                    is_dir = os.path.isdir(full_path)
-                    size = "" if is_dir else self.format_size(stat.st_size)
-                    modified = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M')
-                    prefix = "📁 " if is_dir else "📄 "
-                    items.append((is_dir, item, prefix + item, size, modified))
-                except PermissionError:
-                    items.append((False, item, "🔒 " + item, "", "Access Denied"))
-            
-            # Sort: folders first, then files
-            items.sort(key=lambda x: (not x[0], x[1].lower()))
-            
-            for is_dir, name, display_name, size, modified in items:
-                item_id = self.local_tree.insert('', 'end', values=(display_name, size, modified))
-                self.local_tree.item(item_id, tags=('folder' if is_dir else 'file',))
-                
+            self._show_local_items(self._scan_local_dir(self.current_local_path))
         except Exception as e:
             self.log_message(f"Error reading local directory: {e}", "error")
 
-    def refresh_remote_files(self):
+    def _scan_local_dir(self, path):
+        """Read a local directory into a DirectoryModel; safe to call from threads"""
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                    entries.append((entry.name, entry.is_dir(), stat.st_size, stat.st_mtime))
+                except PermissionError:
+                    entries.append((entry.name, False, 0, 0, DirectoryModel.DENIED, "Access Denied"))
+                except OSError:
+                    continue
+        
+        return DirectoryModel(entries)
+
+    def _show_local_items(self, model):
+        """Fill the local tree with a scanned directory"""
+        self.local_path_var.set(self.current_local_path)
+        self.local_view.load(model)
+
+    def refresh_remote_files(self, session=None, use_cache=False):
         """Refresh remote file list"""
-        if not self.connected:
+        session = session or self.session
+        if not session.connected:
             return
         
-        self.remote_tree.delete(*self.remote_tree.get_children())
-        
         try:
-            self.remote_path_var.set(self.current_remote_path)
+            path = session.current_remote_path
+            session.remote_path_var.set(path)
             
-            # Get file listing
-            items = []
-            self.ftp.cwd(self.current_remote_path)
-            
-            try:
-                # Try MLSD (modern)
-                for name, facts in self.ftp.mlsd():
-                    if name in ['.', '..']:
-                        continue
-                    is_dir = facts.get('type') == 'dir'
-                    size = "" if is_dir else self.format_size(int(facts.get('size', 0)))
-                    modify = facts.get('modify', '')
-                    if modify:
-                        try:
-                            modified = datetime.strptime(modify[:14], '%Y%m%d%H%M%S').strftime('%Y-%m-%d %H:%M')
-                        except:
-                            modified = modify
-                    else:
-                        modified = ""
-                    prefix = "📁 " if is_dir else "📄 "
-                    items.append((is_dir, name, prefix + name, size, modified))
-            except:
-                # Fallback to LIST
-                lines = []
-                self.ftp.dir(lines.append)
-                for line in lines:
-                    parts = line.split()
-                    if len(parts) >= 9:
-                        is_dir = line.startswith('d')
-                        name = ' '.join(parts[8:])
-                        size = "" if is_dir else self.format_size(int(parts[4]))
-                        modified = ' '.join(parts[5:8])
-                        prefix = "📁 " if is_dir else "📄 "
-                        items.append((is_dir, name, prefix + name, size, modified))
+            # Get file listing, from the prefetch cache when allowed
+            prefetch = self.prefetch_var.get()
+            model = session.listing_cache.get(path) if use_cache and prefetch else None
+            cached = model is not None
+            if not cached:
+                model = DirectoryModel.from_listing(list_remote_dir(session.ftp, path))
+                if prefetch:
+                    session.listing_cache.put(path, model)
             
-            # Sort: folders first
-            items.sort(key=lambda x: (not x[0], x[1].lower()))
-            
-            for is_dir, name, display_name, size, modified in items:
-                item_id = self.remote_tree.insert('', 'end', values=(display_name, size, modified))
-                self.remote_tree.item(item_id, tags=('folder' if is_dir else 'file',))
+            session.remote_view.load(model)
                 
-            self.log_message(f"Loaded {len(items)} items from remote", "info")
+            self.log_message(f"Loaded {len(model)} items from remote" + (" (cached)" if cached else ""), "info")
+            self._prefetch(session, [posixpath.dirname(path.rstrip('/')) or '/'])
             
         except Exception as e:
             self.log_message(f"Error reading remote directory: {e}", "error")
 
+    def _remote_changed(self, path=None):
+        """Drop cached listings of a remote folder (or all) that was written to"""
+        if path is not None:
+            path = '/' + posixpath.normpath(path).lstrip('/')
+        for session in self.sessions:
+            session.listing_cache.invalidate(path)
+
+    def _on_prefetch_toggled(self):
+        """Listings are only cached while prefetching is on"""
+        if not self.prefetch_var.get():
+            self._remote_changed()
+
+    def _prefetch(self, session, paths):
+        """Pass listing hints to the session's prefetcher when enabled"""
+        if self.prefetch_var.get() and session.prefetcher is not None:
+            session.prefetcher.hint([p for p in paths if p != session.current_remote_path])
+
+    def _prefetch_selection(self, session):
+        """Prefetch the folders that are selected"""
+        paths = [_join_remote(session.current_remote_path, name)
+                 for name, is_dir in session.remote_view.selected() if is_dir]
+        self._prefetch(session, paths[:5])
+
+    def _prefetch_hover(self, session, event):
+        """Prefetch the folder under the mouse pointer"""
+        item = session.remote_tree.identify_row(event.y)
+        if not item or not session.remote_view.is_dir(item):
+            return
+        path = _join_remote(session.current_remote_path, session.remote_view.name(item))
+        if path != session.hover_path:
+            session.hover_path = path
+            self._prefetch(session, [path])
+
+    def _enter_remote_dir(self, path):
+        """Switch to a remote folder, skipping the server round trips when it is cached"""
+        path = '/' + posixpath.normpath(path).lstrip('/')
+        if self.prefetch_var.get() and self.session.listing_cache.get(path) is not None:
+            self.current_remote_path = path
+        else:
+            self.ftp.cwd(path)
+            self.current_remote_path = self.ftp.pwd()
+        self.refresh_remote_files(use_cache=True)
+
     def upload_file(self):
         """Upload selected local files"""
         if not self.connected:
             messagebox.showwarning("Warning", "Not connected to server")
             return
         
-        selected = self.local_tree.selection()
+        selected = self.local_view.selected()
         if not selected:
             # No selection, open file dialog
             files = filedialog.askopenfilenames(
@@ -569,9 +3944,7 @@ class HyperFTP:
                 for file_path in files:
                     self._upload_single_file(file_path)
         else:
-            for item in selected:
-                values = self.local_tree.item(item)['values']
-                name = values[0].replace("📁 ", "").replace("📄 ", "").replace("🔒 ", "")
+            for name, _ in selected:
                 local_path = os.path.join(self.current_local_path, name)
                 
                 if os.path.isfile(local_path):
@@ -579,41 +3952,70 @@ class HyperFTP:
                 elif os.path.isdir(local_path):
                     self._upload_folder(local_path, name)
 
-    def _upload_single_file(self, file_path):
-        """Upload a single file"""
+    def _upload_single_file(self, file_path, remote_dir=None):
+        """Queue a single file for upload"""
         filename = os.path.basename(file_path)
         file_size = os.path.getsize(file_path)
+        remote_path = _join_remote(remote_dir or self.current_remote_path, filename)
         
         self.log_message(f"Uploading: {filename} ({self.format_size(file_size)})", "info")
         self.status_var.set(f"Uploading: {filename}")
-        
-        def upload_thread():
+        self.transfer_queue.add('upload', self.session_settings, file_path, remote_path)
+
+    def _queue_credentials(self, server):
+        """Login details for a queued job's server from open tabs or saved connections"""
+        candidates = [session.session_settings for session in list(self.sessions)
+                      if session.session_settings]
+        candidates += [settings_from_saved(conn) for conn in self.load_connections().values()]
+        for settings in candidates:
+            if server_key(settings) == server:
+                return settings
+        return None
+
+    def _queue_job_changed(self, job):
+        """Called from queue threads: note digests of finished uploads, then report"""
+        if job['state'] == 'done' and job['kind'] == 'upload' and self._digest_cache is not None:
             try:
-                uploaded = [0]
-                
-                def callback(data):
-                    uploaded[0] += len(data)
-                    progress = (uploaded[0] / file_size) * 100
-                    self.root.after(0, lambda: self.progress_var.set(progress))
-                
-                with open(file_path, 'rb') as f:
-                    self.ftp.storbinary(f'STOR {filename}', f, 8192, callback)
-                
-                self.root.after(0, lambda: self._upload_complete(filename))
-                
-            except Exception as e:
-                self.root.after(0, lambda: self._upload_error(filename, str(e)))
-        
-        thread = threading.Thread(target=upload_thread)
-        thread.daemon = True
-        thread.start()
+                known = self._digest_cache.lookup(job['local'])
+                if known:
+                    self._digest_cache.remember(job['server'], [(job['remote'],) + known])
+            except sqlite3.Error:
+                pass
+        self.root.after(0, lambda: self._on_job_changed(job))
+
+    def _on_job_changed(self, job):
+        """Report queue job state changes"""
+        upload = job['kind'] in TransferQueue.UPLOAD_KINDS
+        if upload:
+            filename = os.path.basename(job['local'])
+        else:
+            filename = posixpath.basename(job['remote'])
+        if job['state'] == 'done' and upload:
+            self._remote_changed(posixpath.dirname(job['remote']) or '/')
+        if job['state'] == 'done':
+            if upload:
+                self._upload_complete(filename)
+                self._schedule_refresh('remote', posixpath.dirname(job['remote']) or '/',
+                                       job['server'])
+            else:
+                self._download_complete(filename)
+                self._schedule_refresh('local', os.path.dirname(job['local']))
+        elif job['state'] == 'failed':
+            if upload:
+                self._upload_error(filename, job['error'])
+            else:
+                self._download_error(filename, job['error'])
+        elif job['state'] == 'pending' and job['error']:
+            delay = max(0, job['next_try'] - time.time())
+            self.log_message(f"Transfer of {filename} failed ({job['error']}), "
+                             f"retrying in {delay:.0f}s", "warning")
+        self._update_queue_window(job)
 
     def _upload_complete(self, filename):
         """Called when upload completes"""
         self.log_message(f"Upload complete: {filename}", "success")
         self.status_var.set("Upload complete")
         self.progress_var.set(0)
-        self.refresh_remote_files()
 
     def _upload_error(self, filename, error):
         """Called when upload fails"""
@@ -627,65 +4029,73 @@ class HyperFTP:
             messagebox.showwarning("Warning", "Not connected to server")
             return
         
-        selected = self.remote_tree.selection()
+        selected = self.remote_view.selected()
         if not selected:
             messagebox.showinfo("Info", "Please select files to download")
             return
         
-        for item in selected:
-            values = self.remote_tree.item(item)['values']
-            name = values[0].replace("📁 ", "").replace("📄 ", "")
-            tags = self.remote_tree.item(item)['tags']
-            
-            if 'folder' not in tags:
+        names = [name for name, is_dir in selected if not is_dir]
+        
+        if len(names) > 1 and self.pool is not None:
+            threading.Thread(target=self._download_batch_thread,
+                             args=(self.pool, self.session_settings, self.current_remote_path,
+                                   self.current_local_path, names), daemon=True).start()
+        else:
+            for name in names:
                 self._download_single_file(name)
 
+    def _download_batch_thread(self, pool, settings, remote_dir, local_dir, names):
+        """Look up all sizes with one pipelined batch, then queue the downloads"""
+        paths = [_join_remote(remote_dir, name) for name in names]
+        try:
+            with pool.session() as ftp:
+                facts = query_metadata(ftp, paths, ('SIZE',))
+        except ftplib.all_errors:
+            facts = {}
+        
+        self.transfer_queue.add_many('download', settings, [
+            (os.path.join(local_dir, name), path, facts.get(path, {}).get('size'))
+            for name, path in zip(names, paths)])
+        self.root.after(0, lambda: self.log_message(f"Downloading {len(names)} files", "info"))
+
     def _download_single_file(self, filename):
-        """Download a single file"""
+        """Queue a single file for download"""
         local_path = os.path.join(self.current_local_path, filename)
+        remote_path = _join_remote(self.current_remote_path, filename)
         
         self.log_message(f"Downloading: {filename}", "info")
         self.status_var.set(f"Downloading: {filename}")
-        
-        def download_thread():
-            try:
-                # Get file size
-                try:
-                    file_size = self.ftp.size(filename)
-                except:
-                    file_size = 0
-                
-                downloaded = [0]
-                
-                def callback(data):
-                    downloaded[0] += len(data)
-                    if file_size > 0:
-                        progress = (downloaded[0] / file_size) * 100
-                        self.root.after(0, lambda: self.progress_var.set(progress))
-                    return data
-                
-                with open(local_path, 'wb') as f:
-                    def write_callback(data):
-                        callback(data)
-                        f.write(data)
-                    
-                    self.ftp.retrbinary(f'RETR {filename}', write_callback, 8192)
-                
-                self.root.after(0, lambda: self._download_complete(filename))
-                
-            except Exception as e:
-                self.root.after(0, lambda: self._download_error(filename, str(e)))
-        
-        thread = threading.Thread(target=download_thread)
-        thread.daemon = True
-        thread.start()
+        self.transfer_queue.add('download', self.session_settings, local_path, remote_path)
 
     def _download_complete(self, filename):
         """Called when download completes"""
         self.log_message(f"Download complete: {filename}", "success")
         self.status_var.set("Download complete")
         self.progress_var.set(0)
-        self.refresh_local_files()
+
+    def _schedule_refresh(self, side, path, server=None):
+        """Refresh a folder shown in a view once, however many transfers into it finish"""
+        if side == 'remote':
+            path = '/' + posixpath.normpath(path).lstrip('/')
+        else:
+            path = os.path.normcase(os.path.abspath(path))
+        key = (side, path, server)
+        if key not in self._pending_refreshes:
+            self._pending_refreshes[key] = self.root.after(
+                self.REFRESH_DELAY, lambda: self._run_refresh(key))
+
+    def _run_refresh(self, key):
+        """Refresh the views still showing a folder that was written to"""
+        del self._pending_refreshes[key]
+        side, path, server = key
+        if side == 'local':
+            if os.path.normcase(os.path.abspath(self.current_local_path)) == path:
+                self.refresh_local_files()
+            return
+        for session in self.sessions:
+            if (session.connected and server_key(session.session_settings) == server
+                    and '/' + posixpath.normpath(session.current_remote_path).lstrip('/') == path):
+                self.refresh_remote_files(session)
 
     def _download_error(self, filename, error):
         """Called when download fails"""
@@ -701,10 +4111,7 @@ class HyperFTP:
         if not selected:
             return
         
-        item = selected[0]
-        values = self.local_tree.item(item)['values']
-        name = values[0].replace("📁 ", "").replace("📄 ", "").replace("🔒 ", "")
-        path = os.path.join(self.current_local_path, name)
+        path = os.path.join(self.current_local_path, self.local_view.name(selected[0]))
         
         if os.path.isdir(path):
             self.current_local_path = path
@@ -720,16 +4127,9 @@ class HyperFTP:
             return
         
         item = selected[0]
-        values = self.remote_tree.item(item)['values']
-        name = values[0].replace("📁 ", "").replace("📄 ", "")
-        tags = self.remote_tree.item(item)['tags']
-        
-        if 'folder' in tags:
+        if self.remote_view.is_dir(item):
             try:
-                new_path = self.current_remote_path.rstrip('/') + '/' + name
-                self.ftp.cwd(new_path)
-                self.current_remote_path = self.ftp.pwd()
-                self.refresh_remote_files()
+                self._enter_remote_dir(_join_remote(self.current_remote_path, self.remote_view.name(item)))
             except Exception as e:
                 self.log_message(f"Cannot enter directory: {e}", "error")
 
@@ -746,9 +4146,7 @@ class HyperFTP:
             return
         
         try:
-            self.ftp.cwd('..')
-            self.current_remote_path = self.ftp.pwd()
-            self.refresh_remote_files()
+            self._enter_remote_dir(posixpath.dirname(self.current_remote_path.rstrip('/')) or '/')
         except Exception as e:
             self.log_message(f"Cannot go up: {e}", "error")
 
@@ -805,7 +4203,7 @@ class HyperFTP:
         name = simpledialog.askstring("New Folder", "Enter folder name:")
         if name:
             try:
-                self.ftp.mkd(name)
+                self.ftp.mkd(_join_remote(self.current_remote_path, name))
                 self.refresh_remote_files()
                 self.log_message(f"Created remote folder: {name}", "success")
             except Exception as e:
@@ -813,16 +4211,14 @@ class HyperFTP:
 
     def delete_local_file(self):
         """Delete selected local files"""
-        selected = self.local_tree.selection()
+        selected = self.local_view.selected()
         if not selected:
             return
         
         if not messagebox.askyesno("Confirm Delete", "Delete selected files?"):
             return
         
-        for item in selected:
-            values = self.local_tree.item(item)['values']
-            name = values[0].replace("📁 ", "").replace("📄 ", "").replace("🔒 ", "")
+        for name, _ in selected:
             path = os.path.join(self.current_local_path, name)
             
             try:
@@ -842,28 +4238,69 @@ class HyperFTP:
         if not self.connected:
             return
         
-        selected = self.remote_tree.selection()
+        selected = self.remote_view.selected()
         if not selected:
             return
         
         if not messagebox.askyesno("Confirm Delete", "Delete selected files from server?"):
             return
         
-        for item in selected:
-            values = self.remote_tree.item(item)['values']
-            name = values[0].replace("📁 ", "").replace("📄 ", "")
-            tags = self.remote_tree.item(item)['tags']
-            
+        folders = []
+        for name, is_dir in selected:
+            if is_dir:
+                folders.append(name)
+                continue
             try:
-                if 'folder' in tags:
-                    self.ftp.rmd(name)
-                else:
-                    self.ftp.delete(name)
+                self.ftp.delete(_join_remote(self.current_remote_path, name))
                 self.log_message(f"Deleted: {name}", "success")
             except Exception as e:
                 self.log_message(f"Cannot delete {name}: {e}", "error")
         
-        self.refresh_remote_files()
+        if folders:
+            self._delete_remote_trees(folders)
+        else:
+            self.refresh_remote_files()
+
+    def _delete_remote_trees(self, names):
+        """Recursively delete remote folders in the background"""
+        paths = [(_join_remote(self.current_remote_path, name), True) for name in names]
+        cancel = threading.Event()
+        
+        window = tk.Toplevel(self.root)
+        window.title("Deleting")
+        window.resizable(False, False)
+        frame = ttk.Frame(window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        progress_var = tk.StringVar(value=f"Deleting {', '.join(names)}...")
+        ttk.Label(frame, textvariable=progress_var, width=50).pack(pady=(0, 10))
+        ttk.Button(frame, text="Cancel", command=cancel.set).pack()
+        window.protocol("WM_DELETE_WINDOW", cancel.set)
+        
+        def progress(files, dirs, errors):
+            text = f"Deleted {files} files, {dirs} folders ({errors} errors)"
+            self.root.after(0, lambda: progress_var.set(text))
+        
+        deleter = RecursiveDeleter(self.pool, paths, workers=self.POOL_SIZE,
+                                   progress=progress, cancel=cancel)
+        
+        def finished():
+            window.destroy()
+            for path, error in deleter.errors[:20]:
+                self.log_message(f"Cannot delete {path}: {error}", "error")
+            summary = f"{deleter.files_deleted} files, {deleter.dirs_deleted} folders"
+            if cancel.is_set():
+                self.log_message(f"Delete cancelled after {summary}", "warning")
+            else:
+                level = "error" if deleter.errors else "success"
+                self.log_message(f"Deleted {summary} ({len(deleter.errors)} errors)", level)
+            self._remote_changed()
+            self.refresh_remote_files()
+        
+        def delete_thread():
+            deleter.run()
+            self.root.after(0, finished)
+        
+        threading.Thread(target=delete_thread, daemon=True).start()
 
     def rename_remote_file(self):
         """Rename remote file"""
@@ -874,15 +4311,15 @@ class HyperFTP:
         if not selected:
             return
         
-        values = self.remote_tree.item(selected[0])['values']
-        old_name = values[0].replace("📁 ", "").replace("📄 ", "")
+        old_name = self.remote_view.name(selected[0])
         
         from tkinter import simpledialog
         new_name = simpledialog.askstring("Rename", "Enter new name:", initialvalue=old_name)
         
         if new_name and new_name != old_name:
             try:
-                self.ftp.rename(old_name, new_name)
+                self.ftp.rename(_join_remote(self.current_remote_path, old_name),
+                                _join_remote(self.current_remote_path, new_name))
                 self.refresh_remote_files()
                 self.log_message(f"Renamed: {old_name} -> {new_name}", "success")
             except Exception as e:
@@ -892,27 +4329,33 @@ class HyperFTP:
     
     def local_context_menu(self, event):
         """Show local file context menu"""
-        menu = tk.Menu(self.root, tearoff=0)
-        menu.add_command(label="Upload", command=self.upload_file)
-        menu.add_command(label="New Folder", command=self.create_local_folder)
-        menu.add_command(label="Delete", command=self.delete_local_file)
-        menu.add_separator()
-        menu.add_command(label="Refresh", command=self.refresh_local_files)
-        menu.tk_popup(event.x_root, event.y_root)
+        if self._local_menu is None:
+            menu = tk.Menu(self.root, tearoff=0)
+            menu.add_command(label="Upload", command=self.upload_file)
+            menu.add_command(label="New Folder", command=self.create_local_folder)
+            menu.add_command(label="Delete", command=self.delete_local_file)
+            menu.add_separator()
+            menu.add_command(label="Refresh", command=self.refresh_local_files)
+            self._local_menu = menu
+        self._local_menu.tk_popup(event.x_root, event.y_root)
 
     def remote_context_menu(self, event):
         """Show remote file context menu"""
         if not self.connected:
             return
         
-        menu = tk.Menu(self.root, tearoff=0)
-        menu.add_command(label="Download", command=self.download_file)
-        menu.add_command(label="New Folder", command=self.create_remote_folder)
-        menu.add_command(label="Rename", command=self.rename_remote_file)
-        menu.add_command(label="Delete", command=self.delete_remote_file)
-        menu.add_separator()
-        menu.add_command(label="Refresh", command=self.refresh_remote_files)
-        menu.tk_popup(event.x_root, event.y_root)
+        if self._remote_menu is None:
+            menu = tk.Menu(self.root, tearoff=0)
+            menu.add_command(label="Download", command=self.download_file)
+            menu.add_command(label="Download and Extract", command=self.download_bundle)
+            menu.add_command(label="Preview", command=self.show_preview)
+            menu.add_command(label="New Folder", command=self.create_remote_folder)
+            menu.add_command(label="Rename", command=self.rename_remote_file)
+            menu.add_command(label="Delete", command=self.delete_remote_file)
+            menu.add_separator()
+            menu.add_command(label="Refresh", command=self.refresh_remote_files)
+            self._remote_menu = menu
+        self._remote_menu.tk_popup(event.x_root, event.y_root)
 
     # ==================== CONNECTION MANAGEMENT ====================
     
@@ -928,6 +4371,8 @@ class HyperFTP:
 
     def save_connections(self):
         """Save connections to config file"""
+        # Never overwrite the file before the startup load has read it
+        self._connections_loaded.wait()
         try:
             with open(self.CONFIG_FILE, 'w') as f:
                 json.dump(self.saved_connections, f, indent=2)
@@ -967,6 +4412,8 @@ class HyperFTP:
             self.passive_var.set(conn.get('passive', True))
             self.toggle_anonymous()
             self.log_message(f"Loaded connection: {name}", "info")
+            if self.prewarm_var.get():
+                self.warm_sessions.warm(settings_from_saved(conn))
 
     def delete_saved_connection(self):
         """Delete a saved connection"""
@@ -1000,15 +4447,659 @@ class HyperFTP:
             self.user_entry.config(state=tk.NORMAL)
             self.pass_entry.config(state=tk.NORMAL)
 
+    # ==================== REMOTE INDEX ====================
+    
+    def _remote_index(self):
+        """Open the index belonging to the current connection"""
+        settings = self.session_settings
+        key = f"{settings['username']}@{settings['host']}_{settings['port']}"
+        key = re.sub(r'[^A-Za-z0-9_.@-]', '_', key)
+        os.makedirs(self.INDEX_DIR, exist_ok=True)
+        return RemoteIndex(os.path.join(self.INDEX_DIR, key + ".sqlite"))
+
+    def update_remote_index(self, full=False):
+        """Crawl the remote tree in the background and update the index"""
+        if not self.connected:
+            messagebox.showwarning("Warning", "Not connected to server")
+            return
+        if getattr(self, '_index_thread', None) and self._index_thread.is_alive():
+            self.log_message("Index update already running", "warning")
+            return
+        
+        index = self._remote_index()
+        settings = self.session_settings
+        self.log_message("Updating remote index...", "info")
+        
+        def progress(listed, path):
+            if listed % 100 == 0:
+                self.root.after(0, lambda: self.status_var.set(f"Indexing: {listed} folders ({path})"))
+        
+        def index_thread():
+            try:
+                ftp = open_session(settings)
+                try:
+                    listed = index.crawl(ftp, ftp.pwd(), full=full, progress=progress)
+                finally:
+                    try:
+                        ftp.quit()
+                    except Exception:
+                        pass
+                total = index.count()
+                self.root.after(0, lambda: self.log_message(
+                    f"Index updated: {listed} folders listed, {total} entries", "success"))
+                self.root.after(0, lambda: self.status_var.set("Index updated"))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: self.log_message(f"Index update failed: {error}", "error"))
+        
+        self._index_thread = threading.Thread(target=index_thread, daemon=True)
+        self._index_thread.start()
+
+    def show_index_search(self):
+        """Show the remote index search window"""
+        if not self.connected:
+            messagebox.showwarning("Warning", "Not connected to server")
+            return
+        
+        index = self._remote_index()
+        window = tk.Toplevel(self.root)
+        window.title("Search Remote Index")
+        window.geometry("700x450")
+        
+        form = ttk.Frame(window, padding="5")
+        form.pack(fill=tk.X)
+        ttk.Label(form, text="Name:").pack(side=tk.LEFT)
+        pattern_var = tk.StringVar()
+        pattern_entry = ttk.Entry(form, textvariable=pattern_var, width=25)
+        pattern_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(form, text="Min size (MB):").pack(side=tk.LEFT)
+        min_size_var = tk.StringVar()
+        ttk.Entry(form, textvariable=min_size_var, width=8).pack(side=tk.LEFT, padx=5)
+        ttk.Label(form, text="Modified after:").pack(side=tk.LEFT)
+        after_var = tk.StringVar()
+        ttk.Entry(form, textvariable=after_var, width=11).pack(side=tk.LEFT, padx=5)
+        
+        results = ttk.Treeview(window, columns=('path', 'size', 'modified'),
+                               show='headings', selectmode='browse')
+        results.heading('path', text='Path', anchor=tk.W)
+        results.heading('size', text='Size', anchor=tk.E)
+        results.heading('modified', text='Modified', anchor=tk.W)
+        results.column('path', width=420)
+        results.column('size', width=80)
+        results.column('modified', width=120)
+        results.pack(fill=tk.BOTH, expand=True, padx=5)
+        
+        info_var = tk.StringVar(value="")
+        ttk.Label(window, textvariable=info_var).pack(fill=tk.X, padx=5, pady=5)
+        
+        found = [DirectoryModel()]
+        searches = [0]  # only the latest search may update the window
+        
+        def show_results(search_id, rows, elapsed):
+            if search_id != searches[0] or not window.winfo_exists():
+                return
+            results.delete(*results.get_children())
+            found[0] = DirectoryModel.from_listing(rows)
+            for i in range(len(found[0])):
+                results.insert('', 'end', iid=str(i), values=found[0].values(i))
+            info_var.set(f"{len(rows)} results in {elapsed:.0f} ms")
+        
+        def show_error(search_id, error):
+            if search_id == searches[0] and window.winfo_exists():
+                info_var.set(f"Search failed: {error}")
+        
+        def run_search(event=None):
+            try:
+                min_size = float(min_size_var.get()) * 1024 * 1024 if min_size_var.get() else None
+                after = after_var.get().replace('-', '').strip() or None
+            except ValueError:
+                messagebox.showerror("Error", "Invalid size", parent=window)
+                return
+            searches[0] += 1
+            search_id = searches[0]
+            pattern = pattern_var.get().strip() or "*"
+            info_var.set("Searching...")
+            
+            def search_thread():
+                try:
+                    index.prepare()
+                    started = time.perf_counter()
+                    rows = index.search(pattern, min_size=min_size, modified_after=after)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    self.root.after(0, lambda: show_results(search_id, rows, elapsed))
+                except sqlite3.Error as e:
+                    error = str(e)
+                    self.root.after(0, lambda: show_error(search_id, error))
+            
+            threading.Thread(target=search_thread, daemon=True).start()
+        
+        def show_count(total):
+            if searches[0] == 0 and window.winfo_exists():
+                info_var.set(f"{total} entries indexed")
+        
+        def count_thread():
+            total = index.count()
+            self.root.after(0, lambda: show_count(total))
+        
+        threading.Thread(target=count_thread, daemon=True).start()
+        
+        def jump(event=None):
+            selected = results.selection()
+            if not selected:
+                return
+            self.jump_to_remote_path(found[0].name(int(selected[0])))
+        
+        ttk.Button(form, text="🔍 Search", command=run_search).pack(side=tk.LEFT, padx=5)
+        pattern_entry.bind('<Return>', run_search)
+        results.bind('<Double-1>', jump)
+        pattern_entry.focus_set()
+
+    def jump_to_remote_path(self, path):
+        """Open the folder containing a remote path and select it"""
+        parent, _, name = path.rstrip('/').rpartition('/')
+        try:
+            self.ftp.cwd(parent or '/')
+            self.current_remote_path = self.ftp.pwd()
+            self.refresh_remote_files()
+        except Exception as e:
+            self.log_message(f"Cannot open {parent}: {e}", "error")
+            return
+        
+        item = self.remote_view.find(name)
+        if item is not None:
+            self.remote_tree.selection_set(item)
+            self.remote_tree.see(item)
+
+    # ==================== FOLDER WATCH ====================
+    
+    def show_watch_folder(self):
+        """Show dialog to start watching a local folder"""
+        if not self.connected:
+            messagebox.showwarning("Warning", "Not connected to server")
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Watch Folder")
+        window.resizable(False, False)
+        frame = ttk.Frame(window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        local_var = tk.StringVar(value=self.current_local_path)
+        remote_var = tk.StringVar(value=self.current_remote_path)
+        stable_var = tk.StringVar(value="2")
+        
+        ttk.Label(frame, text="Local folder:").grid(row=0, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(frame, textvariable=local_var, width=40).grid(row=0, column=1, pady=2)
+        ttk.Button(frame, text="📂", width=3,
+                  command=lambda: local_var.set(filedialog.askdirectory(
+                      initialdir=local_var.get(), parent=window) or local_var.get())
+                  ).grid(row=0, column=2, padx=2)
+        ttk.Label(frame, text="Remote folder:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(frame, textvariable=remote_var, width=40).grid(row=1, column=1, pady=2)
+        ttk.Label(frame, text="Stable after (s):").grid(row=2, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(frame, textvariable=stable_var, width=6).grid(row=2, column=1, sticky=tk.W, pady=2)
+        
+        def start():
+            try:
+                stable = float(stable_var.get())
+            except ValueError:
+                messagebox.showerror("Error", "Invalid stable time", parent=window)
+                return
+            if not os.path.isdir(local_var.get()):
+                messagebox.showerror("Error", "Invalid path", parent=window)
+                return
+            self.start_watcher(local_var.get(), remote_var.get(), stable)
+            window.destroy()
+        
+        ttk.Button(frame, text="👁️ Start Watching", command=start,
+                  style='Success.TButton').grid(row=3, column=0, columnspan=3, pady=(10, 0))
+
+    def start_watcher(self, local_path, remote_path, stable_seconds=2.0):
+        """Start uploading new files from local_path to remote_path"""
+        def on_upload(path, remote):
+            def uploaded():
+                self._remote_changed(posixpath.dirname(remote) or '/')
+                self.log_message(f"Watch upload: {remote}", "success")
+            self.root.after(0, uploaded)
+        
+        def on_error(path, error):
+            message = f"Watch upload failed: {path} - {error}"
+            self.root.after(0, lambda: self.log_message(message, "error"))
+        
+        watcher = FolderWatcher(local_path, remote_path, self.pool, stable_seconds,
+                                workers=self.POOL_SIZE, on_upload=on_upload, on_error=on_error)
+        watcher.start()
+        self.watchers.append(watcher)
+        self.log_message(f"Watching {local_path} -> {remote_path} ({watcher.backend_name})", "info")
+
+    def stop_watchers(self, pool=None):
+        """Stop folder watches, optionally only those using one session's pool"""
+        remaining = []
+        for watcher in self.watchers:
+            if pool is not None and watcher.pool is not pool:
+                remaining.append(watcher)
+                continue
+            watcher.stop()
+            self.log_message(f"Stopped watching {watcher.local_root}", "info")
+        self.watchers = remaining
+
+    # ==================== SITE TO SITE ====================
+    
+    def show_site_to_site(self):
+        """Show dialog for copying a file between two saved servers"""
+        names = list(self.saved_connections.keys())
+        if len(names) < 1:
+            messagebox.showinfo("Info", "Save at least one connection first")
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Site-to-Site Transfer")
+        window.resizable(False, False)
+        frame = ttk.Frame(window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        src_var = tk.StringVar(value=names[0])
+        dst_var = tk.StringVar(value=names[-1])
+        src_path_var = tk.StringVar()
+        dst_path_var = tk.StringVar(value="/")
+        
+        ttk.Label(frame, text="Source:").grid(row=0, column=0, sticky=tk.W, pady=2)
+        ttk.Combobox(frame, textvariable=src_var, values=names, state='readonly',
+                     width=20).grid(row=0, column=1, sticky=tk.W, pady=2)
+        ttk.Label(frame, text="Source file:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(frame, textvariable=src_path_var, width=40).grid(row=1, column=1, pady=2)
+        ttk.Label(frame, text="Destination:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        ttk.Combobox(frame, textvariable=dst_var, values=names, state='readonly',
+                     width=20).grid(row=2, column=1, sticky=tk.W, pady=2)
+        ttk.Label(frame, text="Destination folder:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(frame, textvariable=dst_path_var, width=40).grid(row=3, column=1, pady=2)
+        
+        def start():
+            src_path = src_path_var.get().strip()
+            if not src_path:
+                messagebox.showerror("Error", "Please enter a source file", parent=window)
+                return
+            self.site_to_site_copy(settings_from_saved(self.saved_connections[src_var.get()]),
+                                   settings_from_saved(self.saved_connections[dst_var.get()]),
+                                   [src_path], dst_path_var.get().strip() or "/")
+            window.destroy()
+        
+        ttk.Button(frame, text="🔁 Transfer", command=start,
+                  style='Success.TButton').grid(row=4, column=0, columnspan=2, pady=(10, 0))
+
+    def site_to_site_copy(self, src_settings, dst_settings, src_paths, dst_folder):
+        """Copy remote files between two servers in the background"""
+        self.log_message(f"Site-to-site: {src_settings['host']} -> {dst_settings['host']}", "info")
+        
+        def transfer_thread():
+            src = dst = None
+            try:
+                src = open_session(src_settings)
+                dst = open_session(dst_settings)
+                for src_path in src_paths:
+                    dst_path = _join_remote(dst_folder, src_path.rstrip('/').rsplit('/', 1)[-1])
+                    mode = site_to_site(src, dst, src_path, dst_path)
+                    message = f"Copied {src_path} -> {dst_path} ({mode.upper()})"
+                    self.root.after(0, lambda m=message: self.log_message(m, "success"))
+                    self.root.after(0, lambda: self._remote_changed(dst_folder))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: self.log_message(f"Site-to-site failed: {error}", "error"))
+            finally:
+                for ftp in (src, dst):
+                    if ftp is not None:
+                        try:
+                            ftp.quit()
+                        except ftplib.all_errors:
+                            ftp.close()
+        
+        threading.Thread(target=transfer_thread, daemon=True).start()
+
+    # ==================== REPLICATION ====================
+    
+    def show_replicate(self):
+        """Show dialog for uploading local files to several saved servers"""
+        names = list(self.saved_connections.keys())
+        if not names:
+            messagebox.showinfo("Info", "Save at least one connection first")
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Replicate to Servers")
+        window.resizable(False, False)
+        frame = ttk.Frame(window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        local_var = tk.StringVar(value=self.current_local_path)
+        remote_var = tk.StringVar(value="/")
+        
+        ttk.Label(frame, text="Servers:").grid(row=0, column=0, sticky=tk.NW, pady=2)
+        listbox = tk.Listbox(frame, selectmode=tk.EXTENDED, height=min(len(names), 8),
+                             exportselection=False)
+        for name in names:
+            listbox.insert(tk.END, name)
+        listbox.grid(row=0, column=1, columnspan=2, sticky=tk.EW, pady=2)
+        ttk.Label(frame, text="Local file or folder:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(frame, textvariable=local_var, width=40).grid(row=1, column=1, pady=2)
+        browse = ttk.Frame(frame)
+        browse.grid(row=1, column=2, padx=2)
+        ttk.Button(browse, text="📄", width=3,
+                  command=lambda: local_var.set(filedialog.askopenfilename(
+                      initialdir=self.current_local_path, parent=window) or local_var.get())
+                  ).pack(side=tk.LEFT)
+        ttk.Button(browse, text="📂", width=3,
+                  command=lambda: local_var.set(filedialog.askdirectory(
+                      initialdir=self.current_local_path, parent=window) or local_var.get())
+                  ).pack(side=tk.LEFT)
+        ttk.Label(frame, text="Remote folder:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(frame, textvariable=remote_var, width=40).grid(row=2, column=1, pady=2)
+        
+        def start():
+            targets = [names[i] for i in listbox.curselection()]
+            if not targets:
+                messagebox.showerror("Error", "Please select at least one server", parent=window)
+                return
+            if not os.path.exists(local_var.get()):
+                messagebox.showerror("Error", "Invalid path", parent=window)
+                return
+            if self.replicate(local_var.get(), remote_var.get().strip() or "/", targets):
+                window.destroy()
+        
+        ttk.Button(frame, text="📡 Replicate", command=start,
+                  style='Success.TButton').grid(row=3, column=0, columnspan=3, pady=(10, 0))
+
+    def replicate(self, local_path, remote_folder, names):
+        """Upload a local file or folder to the named saved servers at once"""
+        if self._replicating:
+            messagebox.showwarning("Warning", "A replication is already running")
+            return False
+        
+        local_path = os.path.normpath(local_path)
+        top = os.path.basename(local_path)
+        files = []
+        if os.path.isdir(local_path):
+            for dirpath, dirnames, filenames in os.walk(local_path):
+                dirnames.sort()
+                relative = os.path.relpath(dirpath, local_path).replace(os.sep, '/')
+                remote_dir = _join_remote(remote_folder, top if relative == '.' else f"{top}/{relative}")
+                for filename in sorted(filenames):
+                    files.append((os.path.join(dirpath, filename), _join_remote(remote_dir, filename)))
+        else:
+            files.append((local_path, _join_remote(remote_folder, top)))
+        
+        targets = {name: settings_from_saved(self.saved_connections[name]) for name in names}
+        self._replicator = Replicator(
+            targets, on_change=lambda name: self.root.after(0, self._update_replicate_window))
+        self.log_message(f"Replicating {len(files)} file(s) to {len(names)} server(s)", "info")
+        self._start_replication(lambda: self._replicator.run(files))
+        self.show_replicate_status()
+        return True
+
+    def _start_replication(self, action):
+        """Run a replication pass in the background and log the outcome"""
+        self._replicating = True
+        
+        def replicate_thread():
+            failed = {}
+            try:
+                failed = action()
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: self.log_message(f"Replication failed: {error}", "error"))
+            
+            def finished():
+                self._replicating = False
+                self._remote_changed()
+                self._update_replicate_window()
+                for name, errors in sorted(failed.items()):
+                    if errors:
+                        self.log_message(f"Replication to {name}: {len(errors)} file(s) failed, "
+                                         f"e.g. {next(iter(errors.values()))}", "error")
+                    else:
+                        self.log_message(f"Replication to {name} complete", "success")
+            self.root.after(0, finished)
+        
+        threading.Thread(target=replicate_thread, daemon=True).start()
+
+    def show_replicate_status(self):
+        """Show per-server results of the last replication"""
+        if self._replicate_window is not None and self._replicate_window.winfo_exists():
+            self._replicate_window.lift()
+            self._update_replicate_window()
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Replication")
+        window.geometry("650x300")
+        self._replicate_window = window
+        
+        self.replicate_tree = ttk.Treeview(window, columns=('server', 'state', 'files', 'sent', 'error'),
+                                           show='headings', selectmode='extended')
+        for column, text, width in (('server', 'Server', 120), ('state', 'State', 70),
+                                    ('files', 'Files', 70), ('sent', 'Sent', 80),
+                                    ('error', 'Last Error', 300)):
+            self.replicate_tree.heading(column, text=text, anchor=tk.W)
+            self.replicate_tree.column(column, width=width)
+        self.replicate_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        btn_frame = ttk.Frame(window)
+        btn_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
+        
+        def retry():
+            if self._replicator is None or self._replicating:
+                return
+            names = list(self.replicate_tree.selection()) or None
+            self._start_replication(lambda: self._replicator.retry(names))
+        
+        def cancel():
+            if self._replicator is not None:
+                self._replicator.cancel()
+        
+        ttk.Button(btn_frame, text="🔄 Retry Failed", command=retry).pack(side=tk.LEFT, padx=2)
+        ttk.Button(btn_frame, text="⏹️ Cancel", command=cancel).pack(side=tk.LEFT, padx=2)
+        self._update_replicate_window()
+
+    def _update_replicate_window(self):
+        """Redraw the replication panel if it is open"""
+        if self._replicate_window is None or not self._replicate_window.winfo_exists():
+            return
+        if self._replicator is None:
+            return
+        
+        results = dict(self._replicator.results)
+        for item in self.replicate_tree.get_children():
+            if item not in results:
+                self.replicate_tree.delete(item)
+        for name, result in sorted(results.items()):
+            errors = list(result['failed'].values())
+            values = (name, result['state'], f"{result['done']}/{result['total']}",
+                      self.format_size(result['bytes']), errors[-1] if errors else '')
+            if self.replicate_tree.exists(name):
+                self.replicate_tree.item(name, values=values)
+            else:
+                self.replicate_tree.insert('', 'end', iid=name, values=values)
+
+    # ==================== TRANSFER QUEUE ====================
+    
+    def show_transfer_queue(self):
+        """Show the transfer queue panel"""
+        if self._queue_window is not None and self._queue_window.winfo_exists():
+            self._queue_window.lift()
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Transfer Queue")
+        window.geometry("750x350")
+        self._queue_window = window
+        
+        self.queue_tree = ttk.Treeview(window, columns=('kind', 'file', 'state', 'attempts', 'error'),
+                                       show='headings', selectmode='extended')
+        for column, text, width in (('kind', 'Type', 70), ('file', 'File', 280),
+                                    ('state', 'State', 70), ('attempts', 'Tries', 50),
+                                    ('error', 'Last Error', 250)):
+            self.queue_tree.heading(column, text=text, anchor=tk.W)
+            self.queue_tree.column(column, width=width)
+        self.queue_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        btn_frame = ttk.Frame(window)
+        btn_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
+        
+        def selected_ids():
+            return {int(item) for item in self.queue_tree.selection()}
+        
+        def retry():
+            self.transfer_queue.retry(selected_ids())
+            self._update_queue_window()
+        
+        def remove():
+            self.transfer_queue.remove(selected_ids())
+            self._update_queue_window()
+        
+        def clear():
+            self.transfer_queue.clear_finished()
+            self._update_queue_window()
+        
+        ttk.Button(btn_frame, text="🔄 Retry", command=retry).pack(side=tk.LEFT, padx=2)
+        ttk.Button(btn_frame, text="🗑️ Remove", command=remove).pack(side=tk.LEFT, padx=2)
+        ttk.Button(btn_frame, text="✔️ Clear Finished", command=clear).pack(side=tk.LEFT, padx=2)
+        self._update_queue_window()
+
+    @staticmethod
+    def _queue_row(job):
+        """Queue panel values for one job"""
+        upload = job['kind'] in TransferQueue.UPLOAD_KINDS
+        icon = "⬆️" if upload else "⬇️"
+        path = job['remote'] if upload else job['local']
+        return (f"{icon} {job['kind']}", path, job['state'], job['attempts'], job['error'])
+
+    def _update_queue_window(self, job=None):
+        """Redraw the queue panel if it is open, or just one job's row"""
+        if self._queue_window is None or not self._queue_window.winfo_exists():
+            return
+        if job is not None and self.queue_tree.exists(str(job['id'])):
+            self.queue_tree.item(str(job['id']), values=self._queue_row(job))
+            return
+        
+        rows = {str(job['id']): self._queue_row(job) for job in list(self.transfer_queue.jobs)}
+        for item in self.queue_tree.get_children():
+            if item not in rows:
+                self.queue_tree.delete(item)
+        for item, values in rows.items():
+            if self.queue_tree.exists(item):
+                self.queue_tree.item(item, values=values)
+            else:
+                self.queue_tree.insert('', 'end', iid=item, values=values)
+
+    # ==================== PREVIEW ====================
+    
+    def show_preview(self):
+        """Show the start or end of the selected remote file"""
+        if not self.connected or self.pool is None:
+            messagebox.showwarning("Warning", "Not connected to server")
+            return
+        
+        files = [name for name, is_dir in self.remote_view.selected() if not is_dir]
+        if not files:
+            messagebox.showinfo("Info", "Please select a file to preview")
+            return
+        name = files[0]
+        path = _join_remote(self.current_remote_path, name)
+        
+        if self._preview_window is None or not self._preview_window.winfo_exists():
+            self._build_preview_window()
+        self._preview_window.title(f"Preview - {name}")
+        self._preview_window.lift()
+        
+        self._preview_target = (self.pool, path)
+        self._load_preview()
+
+    def _build_preview_window(self):
+        """Create the preview window"""
+        window = tk.Toplevel(self.root)
+        window.geometry("700x450")
+        self._preview_window = window
+        
+        controls = ttk.Frame(window)
+        controls.pack(fill=tk.X, padx=5, pady=5)
+        self.preview_mode_var = tk.StringVar(value="head")
+        ttk.Radiobutton(controls, text="First", variable=self.preview_mode_var, value="head",
+                        command=self._load_preview).pack(side=tk.LEFT)
+        ttk.Radiobutton(controls, text="Last", variable=self.preview_mode_var, value="tail",
+                        command=self._load_preview).pack(side=tk.LEFT, padx=(5, 0))
+        self.preview_kb_var = tk.StringVar(value=str(self.PREVIEW_KB))
+        ttk.Spinbox(controls, from_=1, to=4096, width=6,
+                    textvariable=self.preview_kb_var).pack(side=tk.LEFT, padx=5)
+        ttk.Label(controls, text="KB").pack(side=tk.LEFT)
+        ttk.Button(controls, text="🔄 Load", command=self._load_preview).pack(side=tk.LEFT, padx=10)
+        self.preview_info_var = tk.StringVar()
+        ttk.Label(controls, textvariable=self.preview_info_var).pack(side=tk.RIGHT)
+        
+        self.preview_text = scrolledtext.ScrolledText(window, wrap=tk.NONE, font=('Consolas', 9),
+                                                      state=tk.DISABLED)
+        self.preview_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
+
+    def _load_preview(self):
+        """Read the requested part of the previewed file in the background"""
+        try:
+            nbytes = max(1, int(self.preview_kb_var.get())) * 1024
+        except ValueError:
+            nbytes = self.PREVIEW_KB * 1024
+        tail = self.preview_mode_var.get() == "tail"
+        self.preview_info_var.set("Loading...")
+        threading.Thread(target=self._preview_thread, args=(nbytes, tail), daemon=True).start()
+
+    def _preview_thread(self, nbytes, tail):
+        """Fetch only the bytes being shown, reusing cached blocks"""
+        try:
+            with self._preview_lock:
+                pool, path = self._preview_target
+                remote_file = self._preview_file
+                if remote_file is None or remote_file.source is not pool or remote_file.path != path:
+                    remote_file = self._preview_file = RemoteFile(pool, path)
+                offset = max(0, remote_file.size - nbytes) if tail else 0
+                remote_file.seek(offset)
+                data = remote_file.read(nbytes)
+                fetched = remote_file.bytes_fetched
+            text = self._format_preview(data, offset)
+            info = (f"{self.format_size(offset)}-{self.format_size(offset + len(data))} "
+                    f"of {self.format_size(remote_file.size)} "
+                    f"(downloaded {self.format_size(fetched)})")
+            self.root.after(0, lambda: self._show_preview(text, info, tail))
+        except Exception as e:
+            error = str(e)
+            self.root.after(0, lambda: self.preview_info_var.set(f"Preview failed: {error}"))
+
+    @staticmethod
+    def _format_preview(data, offset):
+        """Text as-is, binary data as a hex dump"""
+        if b'\0' not in data[:4096]:
+            text = data.decode('utf-8', errors='replace')
+            if offset and '\n' in text:
+                text = text.split('\n', 1)[1]  # drop the partial first line
+            return text
+        lines = []
+        for i in range(0, len(data), 16):
+            chunk = data[i:i + 16]
+            printable = ''.join(chr(c) if 32 <= c < 127 else '.' for c in chunk)
+            lines.append(f"{offset + i:08x}  {chunk.hex(' '):<47}  {printable}")
+        return "\n".join(lines)
+
+    def _show_preview(self, text, info, tail):
+        """Put fetched preview text into the window"""
+        if self._preview_window is None or not self._preview_window.winfo_exists():
+            return
+        self.preview_info_var.set(info)
+        self.preview_text.config(state=tk.NORMAL)
+        self.preview_text.delete('1.0', tk.END)
+        self.preview_text.insert(tk.END, text)
+        self.preview_text.see(tk.END if tail else '1.0')
+        self.preview_text.config(state=tk.DISABLED)
+
     # ==================== UTILITIES ====================
     
     def format_size(self, size):
         """Format file size to human readable"""
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size < 1024:
-                return f"{size:.1f} {unit}"
-            size /= 1024
-        return f"{size:.1f} PB"
+        return format_size(size)
 
     def log_message(self, message, level="info"):
         """Add message to log"""
@@ -1025,37 +5116,162 @@ class HyperFTP:
         if folder:
             self._upload_folder(folder, os.path.basename(folder))
 
-    def _upload_folder(self, local_path, remote_name):
+    def _upload_folder(self, local_path, remote_name, remote_parent=None):
         """Upload folder recursively"""
         if not self.connected:
             return
         
+        remote_dir = _join_remote(remote_parent or self.current_remote_path, remote_name)
+        if self.pool is None:
+            return
+        if self.skip_identical_var.get():
+            self.status_var.set(f"Comparing {remote_name}...")
+            threading.Thread(target=self._upload_changed_thread,
+                             args=(self.pool, self.session_settings, local_path, remote_dir),
+                             daemon=True).start()
+            return
+        
+        self.status_var.set(f"Queueing {remote_name}...")
+        threading.Thread(target=self._upload_folder_thread,
+                         args=(self.pool, self.session_settings, local_path, remote_dir),
+                         daemon=True).start()
+
+    def _upload_folder_thread(self, pool, settings, local_root, remote_root):
+        """Create the remote folders, then queue every file in one batch"""
         try:
-            # Create remote folder
-            try:
-                self.ftp.mkd(remote_name)
-            except:
-                pass
+            files = []
+            with pool.session() as ftp:
+                for dirpath, dirnames, filenames in os.walk(local_root):
+                    dirnames.sort()
+                    relative = os.path.relpath(dirpath, local_root).replace(os.sep, '/')
+                    remote_dir = remote_root if relative == '.' else _join_remote(remote_root, relative)
+                    try:
+                        ftp.mkd(remote_dir)
+                    except ftplib.error_perm:
+                        pass
+                    for name in sorted(filenames):
+                        files.append((os.path.join(dirpath, name), _join_remote(remote_dir, name)))
+            
+            self.transfer_queue.add_many('upload', settings, files)
+            self.root.after(0, lambda: self.log_message(
+                f"Queued {len(files)} files from {os.path.basename(local_root)}", "info"))
+        except Exception as e:
+            error = str(e)
+            self.root.after(0, lambda: self.log_message(f"Folder upload error: {error}", "error"))
+
+    def upload_bundle(self):
+        """Upload a folder as a single streamed archive"""
+        if not self.connected:
+            messagebox.showwarning("Warning", "Not connected to server")
+            return
+        folder = filedialog.askdirectory(title="Select folder to bundle",
+                                         initialdir=self.current_local_path)
+        if not folder:
+            return
+        name = os.path.basename(os.path.normpath(folder)) + self.bundle_suffix_var.get()
+        remote_path = _join_remote(self.current_remote_path, name)
+        self.log_message(f"Uploading bundle: {name}", "info")
+        self.status_var.set(f"Uploading: {name}")
+        self.transfer_queue.add('bundle_upload', self.session_settings, folder, remote_path)
+
+    def download_bundle(self):
+        """Download selected archives, extracting them while they arrive"""
+        if not self.connected:
+            messagebox.showwarning("Warning", "Not connected to server")
+            return
+        
+        names = [name for name, is_dir in self.remote_view.selected()
+                 if not is_dir and bundle_compression(name) is not None]
+        if not names:
+            suffixes = ", ".join(suffix for suffix, _ in BUNDLE_SUFFIXES)
+            messagebox.showinfo("Info", f"Please select archives ({suffixes})")
+            return
+        
+        for name in names:
+            self.log_message(f"Downloading and extracting: {name}", "info")
+            self.transfer_queue.add('bundle_download', self.session_settings, self.current_local_path,
+                                    _join_remote(self.current_remote_path, name))
+
+    def _digests(self):
+        """Open the local digest cache on first use"""
+        if self._digest_cache is None:
+            self._digest_cache = DigestCache(self.DIGEST_DB)
+        return self._digest_cache
+
+    def _upload_changed_thread(self, pool, settings, local_root, remote_root):
+        """Queue the files of a folder whose remote copy differs"""
+        try:
+            cache = self._digests()
+            server = server_key(settings)
+            files = []
             
-            # Save current path
-            original_remote = self.current_remote_path
+            with pool.session() as ftp:
+                for dirpath, _, filenames in os.walk(local_root):
+                    rel = os.path.relpath(dirpath, local_root)
+                    remote_dir = remote_root
+                    if rel != os.curdir:
+                        remote_dir = _join_remote(remote_root, rel.replace(os.sep, '/'))
+                    try:
+                        ftp.mkd(remote_dir)
+                    except ftplib.error_perm:
+                        pass
+                    try:
+                        remote_sizes = {name: size for name, is_dir, size, _ in
+                                        list_remote_dir(ftp, remote_dir) if not is_dir}
+                    except ftplib.error_perm:
+                        remote_sizes = {}
+                    for name in filenames:
+                        files.append((os.path.join(dirpath, name), _join_remote(remote_dir, name),
+                                      remote_sizes.get(name)))
             
-            # Enter remote folder
-            self.ftp.cwd(remote_name)
+            # Only files of the same size as the remote copy can be identical
+            candidates = []
+            for local, remote, remote_size in files:
+                try:
+                    if remote_size is not None and os.path.getsize(local) == remote_size:
+                        candidates.append((local, remote))
+                except OSError:
+                    pass
+            digests = cache.digests([local for local, _ in candidates])
+            remembered = cache.remembered(server, [remote for _, remote in candidates])
+            sizes = {remote: remote_size for _, remote, remote_size in files}
             
-            # Upload contents
-            for item in os.listdir(local_path):
-                item_path = os.path.join(local_path, item)
-                if os.path.isfile(item_path):
-                    self._upload_single_file(item_path)
-                elif os.path.isdir(item_path):
-                    self._upload_folder(item_path, item)
+            unknown = []
+            identical = set()
+            for local, remote in candidates:
+                known = digests.get(local)
+                if known is None or known[0] != sizes[remote]:
+                    continue
+                if remembered.get(remote) == known:
+                    identical.add(local)
+                else:
+                    unknown.append((local, remote, known))
             
-            # Return to original path
-            self.ftp.cwd(original_remote)
+            # Files never uploaded from here are checked against the server
+            if unknown:
+                verified = []
+                hash_commands = list(REMOTE_DIGEST_COMMANDS)
+                with pool.session() as ftp:
+                    try:
+                        ftp.sendcmd('OPTS HASH SHA-256')
+                    except (ftplib.error_perm, ftplib.error_reply):
+                        hash_commands.remove('HASH')
+                    for local, remote, known in unknown:
+                        if not hash_commands:
+                            break
+                        if remote_digest(ftp, remote, hash_commands) == known[1]:
+                            identical.add(local)
+                            verified.append((remote,) + known)
+                cache.remember(server, verified)
             
+            changed = [(local, remote) for local, remote, _ in files if local not in identical]
+            self.transfer_queue.add_many('upload', settings, changed)
+            skipped = len(identical)
+            self.root.after(0, lambda: self.log_message(
+                f"Queued {len(changed)} changed files, skipped {skipped} identical", "info"))
         except Exception as e:
-            self.log_message(f"Folder upload error: {e}", "error")
+            error = str(e)
+            self.root.after(0, lambda: self.log_message(f"Folder upload error: {error}", "error"))
 
     # ==================== DIALOGS ====================
     
@@ -1103,6 +5319,9 @@ HyperFTP - Quick Start Guide
    - Ctrl+D: Download selected
    - F5: Refresh local
    - F6: Refresh remote
+   - Ctrl+F: Search remote index
+   - Ctrl+T: New server tab
+   - Ctrl+W: Close server tab
 
 4. SAVE CONNECTIONS:
    - Click "Save Connection" to save current settings
@@ -1118,21 +5337,311 @@ HyperFTP - Quick Start Guide
         text.insert('1.0', docs.strip())
         text.config(state=tk.DISABLED)
 
+    # ==================== DIAGNOSTICS ====================
+    
+    def toggle_stall_detector(self):
+        """Start or stop measuring main-loop latency"""
+        if self.stall_var.get():
+            self.diagnostics.start()
+            self.log_message(f"Reporting UI stalls over "
+                             f"{self.diagnostics.STALL_THRESHOLD * 1000:.0f} ms", "info")
+        else:
+            self.diagnostics.stop()
+
+    def toggle_cpu_profile(self):
+        """Start or stop profiling the UI thread"""
+        if self.cpu_profile_var.get():
+            self.diagnostics.start_profile()
+            self.log_message("CPU profiling started", "info")
+        else:
+            self.diagnostics.stop_profile()
+            self.log_message("CPU profiling stopped", "info")
+
+    def toggle_memory_trace(self):
+        """Start or stop tracing memory allocations"""
+        if self.memory_trace_var.get():
+            self.diagnostics.start_memory_trace()
+            self.log_message("Memory tracing started", "info")
+        else:
+            self.diagnostics.stop_memory_trace()
+            self.log_message("Memory tracing stopped", "info")
+
+    def write_diagnostics_report(self):
+        """Dump stall, profile and memory data to the report file"""
+        try:
+            path = self.diagnostics.write_report()
+        except OSError as e:
+            messagebox.showerror("Error", f"Cannot write report: {e}")
+            return
+        self.log_message(f"Diagnostics report written to {os.path.abspath(path)}", "success")
+
+    def _on_stall(self, stall):
+        """Log a main-loop stall once the UI is responsive again"""
+        self.log_message(f"UI blocked for {stall['duration'] * 1000:.0f} ms in {stall['where']}",
+                         "warning")
+
     def on_closing(self):
         """Handle window close"""
-        if self.connected:
+        connected = [session for session in self.sessions if session.connected]
+        if connected:
             if messagebox.askyesno("Confirm Exit", "Disconnect and exit?"):
-                self.disconnect_ftp()
+                self.transfer_queue.stop()
+                for session in connected:
+                    self.disconnect_ftp(session)
+                self.warm_sessions.close()
                 self.root.destroy()
         else:
+            self.transfer_queue.stop()
+            self.warm_sessions.close()
             self.root.destroy()
 
 
 # ==================== MAIN ====================
 
+class StartupProfiler:
+    """Records how long each startup phase takes"""
+
+    REPORT_FILE = "hyperftp_startup.txt"
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.marks = []
+        self._profile = None
+        if enabled:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def mark(self, label):
+        """Record the time since start for a phase"""
+        if self.enabled:
+            self.marks.append((label, time.perf_counter() - self.started))
+
+    def finish(self, app):
+        """Stop profiling and publish the report once startup is done"""
+        if not self.enabled or self._profile is None:
+            return
+        self._profile.disable()
+        
+        lines = ["HyperFTP startup profile", ""]
+        previous = 0.0
+        for label, elapsed in self.marks:
+            lines.append(f"{elapsed * 1000:8.1f} ms  (+{(elapsed - previous) * 1000:7.1f})  {label}")
+            previous = elapsed
+        stats_text = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stats_text)
+        stats.sort_stats('cumulative').print_stats(25)
+        report = "\n".join(lines) + "\n\n" + stats_text.getvalue()
+        self._profile = None
+        
+        for line in lines[2:]:
+            app.log_message(f"Startup: {line.strip()}", "info")
+        try:
+            with open(self.REPORT_FILE, 'w', encoding='utf-8') as f:
+                f.write(report)
+        except OSError as e:
+            app.log_message(f"Could not write startup profile: {e}", "error")
+            return
+        app.log_message(f"Startup profile written to {self.REPORT_FILE}", "info")
+
+
+class Diagnostics:
+    """Main-loop stall detection and on-demand profiling.
+
+    A heartbeat ``after`` timer measures how late Tk runs it, and a
+    watchdog thread captures the main thread's stack once the heartbeat
+    is overdue by more than STALL_THRESHOLD. cProfile and tracemalloc
+    sessions can be started and stopped at any time; write_report()
+    collects everything into one text file.
+    """
+
+    REPORT_FILE = "hyperftp_diagnostics.txt"
+    HEARTBEAT = 0.05
+    STALL_THRESHOLD = 0.25
+    MAX_STALLS = 200
+    MAX_SAMPLES = 20000
+
+    def __init__(self, root, on_stall=None):
+        self.root = root
+        self.on_stall = on_stall
+        self.main_thread = threading.get_ident()
+        self.monitoring = False
+        self.latencies = deque(maxlen=self.MAX_SAMPLES)
+        self.stalls = deque(maxlen=self.MAX_STALLS)
+        self._lock = threading.Lock()
+        self._due = 0.0
+        self._stall = None
+        self._after_id = None
+        self.profiling = False
+        self._profile = None
+        self._baseline = None
+        self._memory_text = ""
+
+    # Stall detection
+    
+    def start(self):
+        """Begin the heartbeat and the watchdog thread"""
+        if self.monitoring:
+            return
+        self.monitoring = True
+        with self._lock:
+            self._due = time.perf_counter() + self.HEARTBEAT
+            self._stall = None
+        self._after_id = self.root.after(int(self.HEARTBEAT * 1000), self._beat)
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def stop(self):
+        self.monitoring = False
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _beat(self):
+        """Heartbeat on the Tk thread; records how late it ran"""
+        now = time.perf_counter()
+        with self._lock:
+            self.latencies.append(now - self._due)
+            stall = self._stall
+            if stall is not None:
+                stall['duration'] = now - stall['since']
+                self.stalls.append(stall)
+                self._stall = None
+            self._due = now + self.HEARTBEAT
+        if not self.monitoring:
+            return
+        self._after_id = self.root.after(int(self.HEARTBEAT * 1000), self._beat)
+        if stall is not None and self.on_stall:
+            self.on_stall(stall)
+
+    def _watch(self):
+        """Capture the main thread's stack when a heartbeat is overdue"""
+        while self.monitoring:
+            time.sleep(self.HEARTBEAT / 2)
+            with self._lock:
+                if self._stall is not None:
+                    continue
+                if time.perf_counter() - self._due < self.STALL_THRESHOLD:
+                    continue
+                frame = sys._current_frames().get(self.main_thread)
+                self._stall = {
+                    'since': self._due,
+                    'duration': 0.0,
+                    'when': datetime.now().strftime('%H:%M:%S'),
+                    'where': self._where(frame),
+                    'stack': ''.join(traceback.format_stack(frame)) if frame else ''
+                }
+
+    @staticmethod
+    def _where(frame):
+        """The innermost frame of our own code, else the innermost frame"""
+        innermost = frame
+        while frame is not None:
+            if frame.f_code.co_filename == __file__:
+                break
+            frame = frame.f_back
+        frame = frame or innermost
+        if frame is None:
+            return "unknown"
+        return f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+
+    # Profiling
+    
+    def start_profile(self):
+        """Profile everything the UI thread does from now on"""
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+        self._profile.enable()
+        self.profiling = True
+
+    def stop_profile(self):
+        if self._profile is not None:
+            self._profile.disable()
+        self.profiling = False
+
+    def start_memory_trace(self):
+        """Trace allocations, comparing later snapshots to this point"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+        self._baseline = tracemalloc.take_snapshot()
+
+    def stop_memory_trace(self):
+        self._memory_text = self._memory_report()
+        tracemalloc.stop()
+
+    def _memory_report(self):
+        if not tracemalloc.is_tracing() or self._baseline is None:
+            return self._memory_text
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced memory: {current / 1024:.0f} KB now, {peak / 1024:.0f} KB peak",
+                 "Top allocation growth since tracing started:"]
+        for stat in snapshot.compare_to(self._baseline, 'lineno')[:25]:
+            lines.append(f"  {stat}")
+        return "\n".join(lines)
+
+    # Reporting
+    
+    def report(self):
+        """Summarise latencies, stalls, the CPU profile and memory growth"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            stalls = list(self.stalls)
+        
+        lines = [f"HyperFTP diagnostics {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ""]
+        if latencies:
+            def pct(p):
+                return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+            lines.append(f"Main loop latency over {len(latencies)} heartbeats: "
+                         f"p50 {pct(0.5):.1f} ms, p95 {pct(0.95):.1f} ms, "
+                         f"p99 {pct(0.99):.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+        else:
+            lines.append("Stall detection has not run")
+        
+        lines.append(f"Stalls over {self.STALL_THRESHOLD * 1000:.0f} ms: {len(stalls)}")
+        by_where = {}
+        for stall in stalls:
+            total = by_where.setdefault(stall['where'], [0, 0.0])
+            total[0] += 1
+            total[1] += stall['duration']
+        for where, (count, duration) in sorted(by_where.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {duration * 1000:8.0f} ms  {count:4d}x  {where}")
+        for stall in sorted(stalls, key=lambda stall: -stall['duration'])[:10]:
+            lines += ["", f"Stall at {stall['when']} for {stall['duration'] * 1000:.0f} ms:",
+                      stall['stack'].rstrip()]
+        
+        if self._profile is not None:
+            stats_text = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=stats_text)
+            stats.sort_stats('cumulative').print_stats(30)
+            if self.profiling:
+                self._profile.enable()  # collecting the stats disabled it
+            lines += ["", "CPU profile of the UI thread:", stats_text.getvalue()]
+        
+        memory = self._memory_report()
+        if memory:
+            lines += ["", memory]
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path=None):
+        """Write report() to a file and return its path"""
+        path = path or self.REPORT_FILE
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.report())
+        return path
+
+
 def main():
     """Application entry point"""
+    parser = argparse.ArgumentParser(description="HyperFTP - Professional FTP Client")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="report how long each startup phase takes")
+    parser.add_argument('--diagnostics', action='store_true',
+                        help="log UI stalls from startup")
+    args = parser.parse_args()
+    
+    profiler = StartupProfiler(enabled=args.profile_startup)
     root = tk.Tk()
+    profiler.mark("Tk initialised")
     
     # Set icon (optional)
     try:
@@ -1141,16 +5650,20 @@ def main():
         pass
     
     # Center window
-    root.update_idletasks()
     width = 1000
     height = 700
     x = (root.winfo_screenwidth() // 2) - (width // 2)
     y = (root.winfo_screenheight() // 2) - (height // 2)
     root.geometry(f'{width}x{height}+{x}+{y}')
     
-    app = HyperFTP(root)
+    app = HyperFTP(root, profiler)
+    if args.diagnostics:
+        app.stall_var.set(True)
+        app.toggle_stall_detector()
     root.mainloop()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Frozen builds start digest workers by re-running this script
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,116 @@
+import contextlib
+import ftplib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from HyperFTP import RecursiveDeleter  # noqa: E402
+
+
+class LocalFTP:
+    """Stand-in session that serves a local folder the way pyftpdlib does.
+
+    Like most servers it follows symlinks when building MLSD facts, so a
+    link to a folder is reported with ``type=dir``.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _local(self, path):
+        return os.path.join(self.root, path.lstrip('/'))
+
+    def mlsd(self, path="", facts=None):
+        local = self._local(path)
+        for name in sorted(os.listdir(local)):
+            full = os.path.join(local, name)
+            if os.path.isdir(full):
+                yield name, {'type': 'dir', 'modify': '20260101000000'}
+            else:
+                yield name, {'type': 'file', 'size': str(os.path.getsize(full)),
+                             'modify': '20260101000000'}
+
+    def delete(self, path):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            raise ftplib.error_perm("550 %s." % e.strerror)
+
+    def rmd(self, path):
+        try:
+            os.rmdir(self._local(path))
+        except OSError as e:
+            raise ftplib.error_perm("550 %s." % e.strerror)
+
+
+class LocalPool:
+    def __init__(self, root):
+        self.root = root
+
+    @contextlib.contextmanager
+    def session(self):
+        yield LocalFTP(self.root)
+
+
+class RecursiveDeleterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, path, data="x"):
+        full = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, 'w') as f:
+            f.write(data)
+
+    def test_deletes_nested_tree(self):
+        self.write('tree/a.txt')
+        self.write('tree/sub/b.txt')
+        self.write('tree/sub/deeper/c.txt')
+        os.makedirs(os.path.join(self.root, 'tree/empty'))
+
+        deleter = RecursiveDeleter(LocalPool(self.root), [('/tree', True)])
+        self.assertTrue(deleter.run())
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'tree')))
+        self.assertEqual(deleter.files_deleted, 3)
+        self.assertEqual(deleter.dirs_deleted, 4)
+
+    def test_symlinked_folder_is_not_entered(self):
+        self.write('keep/important.txt')
+        self.write('tree/a.txt')
+        try:
+            os.symlink(os.path.join(self.root, 'keep'),
+                       os.path.join(self.root, 'tree', 'link'),
+                       target_is_directory=True)
+        except (OSError, NotImplementedError):
+            self.skipTest("symlinks are not available")
+
+        deleter = RecursiveDeleter(LocalPool(self.root), [('/tree', True)])
+        self.assertTrue(deleter.run())
+        self.assertFalse(os.path.lexists(os.path.join(self.root, 'tree')))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.root, 'keep', 'important.txt')))
+
+    def test_symlinked_folder_selected_directly(self):
+        self.write('keep/important.txt')
+        try:
+            os.symlink(os.path.join(self.root, 'keep'),
+                       os.path.join(self.root, 'link'),
+                       target_is_directory=True)
+        except (OSError, NotImplementedError):
+            self.skipTest("symlinks are not available")
+
+        deleter = RecursiveDeleter(LocalPool(self.root), [('/link', True)])
+        self.assertTrue(deleter.run())
+        self.assertFalse(os.path.lexists(os.path.join(self.root, 'link')))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.root, 'keep', 'important.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()